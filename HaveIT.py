@@ -1,19 +1,37 @@
 import logging
 import os
+import sys
 import asyncio
 import time
 import html
 import subprocess
 import requests
+import httpx
 import re
 import json
 import math
 import glob
+import shutil
+import tempfile
+import signal
+import hashlib
+import copy
+import contextlib
+import functools
+import itertools
+import sqlite3
+import threading
+from types import SimpleNamespace
+from pathlib import Path
+from collections import deque, defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from thefuzz import fuzz
+from thefuzz import utils as fuzz_utils
+from rapidfuzz import process as rf_process, fuzz as rf_fuzz
 from bs4 import BeautifulSoup
 from mutagen.mp3 import MP3
 from mutagen.id3 import ID3, APIC, TIT2, TPE1
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ChatMember, Chat
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ChatMember, Chat, Message
 from telegram.constants import ParseMode, ChatType, ChatMemberStatus
 from telegram.ext import (
     Application, 
@@ -22,79 +40,619 @@ from telegram.ext import (
     filters, 
     CallbackContext, 
     CallbackQueryHandler,
-    ChatMemberHandler
+    ChatMemberHandler,
+    BaseRateLimiter,
+    ExtBot
 )
-from telegram.error import RetryAfter, TimedOut, BadRequest, Forbidden
+from telegram.request import HTTPXRequest
+from telegram.error import RetryAfter, TimedOut, BadRequest, Forbidden, TelegramError
 import yt_dlp
+try:
+    import h2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+from yt_dlp.networking import Request
+from yt_dlp.networking.exceptions import RequestError
 
 # --- CONFIGURATION ---
 ALLOWED_CHAT_IDS = [809612055, -1001919485429, 93365812, 114726592]
-MAX_DURATION_SECONDS = 1200
-PROXY_URL = 'socks5://127.0.0.1:3420'
+ADMIN_CHAT_IDS = [809612055]
+PROXY_URL = os.getenv("HAVEIT_PROXY_URL", 'socks5://127.0.0.1:3420')
 BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+TELEGRAM_BASE_URL = os.getenv("TELEGRAM_BASE_URL", "https://api.telegram.org/bot")
+TELEGRAM_BASE_FILE_URL = os.getenv("TELEGRAM_BASE_FILE_URL", "https://api.telegram.org/file/bot")
+TELEGRAM_LOCAL_MODE = os.getenv("TELEGRAM_LOCAL_MODE", "0") == "1"
+LARGE_FILES = os.getenv("HAVEIT_LARGE_FILES", "1" if TELEGRAM_LOCAL_MODE else "0") == "1"
+MAX_UPLOAD_BYTES = (2000 if LARGE_FILES else 50) * 1024 ** 2
+MAX_DURATION_SECONDS = 3 * 3600 if LARGE_FILES else 1200
 BASE_DATA_DIR = "Users_Data"
 CACHE_CHANNEL_ID = -1003848388297
 CACHE_FILE = os.path.join(BASE_DATA_DIR, "global_cache.json")
+DB_FILE = os.path.join(BASE_DATA_DIR, "haveit.db")
+CACHE_FLUSH_INTERVAL = 5
+CACHE_FLUSH_BATCH = 200
+CACHE_COMPACT_INTERVAL = 6 * 3600
+HISTORY_MAX_PER_USER = 5000
+METRICS_HOST = os.getenv("HAVEIT_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("HAVEIT_METRICS_PORT", "9108"))
+METRICS_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+METRICS_SAMPLES = 512
+METRICS_SYNC_INTERVAL = 5
+WEBHOOK_URL = os.getenv("HAVEIT_WEBHOOK_URL")
+WEBHOOK_LISTEN = os.getenv("HAVEIT_WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("HAVEIT_WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("HAVEIT_WEBHOOK_PATH", "telegram")
+WEBHOOK_SECRET = os.getenv("HAVEIT_WEBHOOK_SECRET")
+WEBHOOK_CONCURRENCY = int(os.getenv("HAVEIT_WEBHOOK_CONCURRENCY", "16"))
+MAX_CONCURRENT_JOBS = 3
+WORKER_COUNT = int(os.getenv("HAVEIT_WORKERS", "0"))
+WORKER_JOBS = int(os.getenv("HAVEIT_WORKER_JOBS", "2"))
+WORKER_RESTART_DELAY = 5
+JOB_POLL_INTERVAL = 1.0
+JOB_HEARTBEAT_INTERVAL = 10
+JOB_STALE_AFTER = 120
+JOB_KEEP = 86400
+MAX_QUEUED_PER_CHAT = 10
+MEDIA_WORKERS = 6
+STREAM_ENCODE = True
+YTDL_CACHE_DIR = os.path.join(BASE_DATA_DIR, "yt_dlp_cache")
+YDL_POOL_SIZE = 4
+MEDIA_CACHE_DIR = os.path.join(BASE_DATA_DIR, "media_cache")
+MEDIA_CACHE_BYTES = 2 * 1024 ** 3
+UPLOAD_DIR = os.path.join(BASE_DATA_DIR, "uploads")
+COVER_THUMB_SIZE = 320
+COVER_DISPLAY_WIDTH = 1280
+COVER_MIME = {'.jpg': 'image/jpeg', '.jpeg': 'image/jpeg', '.png': 'image/png', '.webp': 'image/webp'}
+WARP_CLI = os.getenv("WARP_CLI", "warp-cli")
+WARP_DISCONNECT_WAIT = 3
+WARP_CONNECT_WAIT = 6
+ROUTE_PROBE_URL = "https://www.google.com"
+ROUTE_MAX_ATTEMPTS = 5
+ROUTE_BACKOFF_BASE = 5
+ROUTE_BACKOFF_MAX = 60
+ROUTE_HEALTH_INTERVAL = 120
+LRCLIB_URL = "https://lrclib.net"
+GENIUS_URL = "https://genius.com"
+HTTP_MAX_CONNECTIONS = 32
+SPOTIFY_TRACK_RE = re.compile(r'open\.spotify\.com/(?:intl-[a-zA-Z-]+/)?(?:embed/)?track/([A-Za-z0-9]{22})')
+SPOTIFY_TITLE_RE = re.compile(rb'<title[^>]*>(.*?)</title>', re.S | re.I)
+SPOTIFY_HEAD_LIMIT = 256 * 1024
+SEARCH_CACHE_TTL = 7 * 86400
+SEARCH_CACHE_MAX = 20000
+CACHE_TRIM_EVERY = 50
+YOUTUBE_ID_RE = re.compile(r'(?:youtube\.com/(?:watch\?(?:\S*&)?v=|shorts/|embed/|live/)|youtu\.be/)([A-Za-z0-9_-]{11})')
+SOUNDCLOUD_PATH_RE = re.compile(r'soundcloud\.com/([^?#\s]+)')
+LINK_RE = re.compile(r'https?://\S+')
+BATCH_MAX_TRACKS = 50
+BATCH_CONCURRENCY = 3
+BATCH_RESULTS_KEEP = 100
+LYRICS_TTL = 30 * 86400
+LYRICS_NEGATIVE_TTL = 6 * 3600
+LYRICS_CACHE_MAX = 20000
+LOOKUP_ERROR = "error"
+HTTP_DEFAULT_HOST_LIMIT = 4
+HTTP_DEFAULT_TIMEOUT = 10
+HTTP_HOST_LIMITS = {'lrclib.net': 6, 'genius.com': 4, 'open.spotify.com': 6}
+HTTP_HOST_TIMEOUTS = {'lrclib.net': 4, 'genius.com': 5, 'open.spotify.com': 10}
+STATUS_TICK = 0.5
+STATUS_MIN_INTERVAL = 3.0
+STATUS_EDITS_PER_TICK = 10
+STATUS_IDLE_TTL = 600
+TG_GLOBAL_RATE = 30
+TG_CHAT_RATE = (1, 3)
+TG_GROUP_RATE = (20 / 60, 5)
+TG_MAX_RETRIES = 3
+TG_RETRY_BACKOFF = 1
+TG_LANE_DELIVERY, TG_LANE_MESSAGE, TG_LANE_EDIT = 0, 1, 2
+TG_LANES = {
+    'sendAudio': TG_LANE_DELIVERY, 'sendPhoto': TG_LANE_DELIVERY, 'sendDocument': TG_LANE_DELIVERY,
+    'copyMessage': TG_LANE_DELIVERY, 'copyMessages': TG_LANE_DELIVERY, 'forwardMessage': TG_LANE_DELIVERY,
+    'sendMessage': TG_LANE_MESSAGE, 'deleteMessage': TG_LANE_MESSAGE, 'deleteMessages': TG_LANE_MESSAGE,
+    'editMessageText': TG_LANE_EDIT, 'editMessageCaption': TG_LANE_EDIT, 'editMessageReplyMarkup': TG_LANE_EDIT,
+}
 # ---------------------
 
 logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-active_chats = set()
-last_update_time = {}
 user_states = {}
+background_tasks = set()
+inflight = {}
+batch_results = {}
+_db = None
+db_lock = threading.Lock()
+metrics_server = None
+worker_procs = {}
+claimed_jobs = {}
+media_executor = ThreadPoolExecutor(max_workers=MEDIA_WORKERS, thread_name_prefix="media")
+# SQLite work is serialised by db_lock anyway; one thread keeps it off the event loop without tying up media_executor.
+db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db")
+
+def get_db():
+    """Shared SQLite connection for every persistent store of the bot."""
+    global _db
+    with db_lock:
+        if _db is None:
+            os.makedirs(BASE_DATA_DIR, exist_ok=True)
+            _db = sqlite3.connect(DB_FILE, check_same_thread=False)
+            _db.execute("PRAGMA journal_mode=WAL")
+            _db.execute("PRAGMA synchronous=NORMAL")
+        return _db
+
+class Metrics:
+    """
+    Process-wide counters and per-stage latency histograms. Rendered in the
+    Prometheus text format on the metrics endpoint and summarized by /stats;
+    recent samples are kept per stage for percentiles. In worker mode the
+    front end merges in the snapshots the workers publish to SQLite.
+    """
+    def __init__(self):
+        self.counters = defaultdict(float)
+        self.histograms = {}
+        self.remote = {}
+        self.lock = threading.Lock()
+        self.started = time.time()
+
+    def inc(self, name, amount=1, **labels):
+        with self.lock: self.counters[(name, tuple(sorted(labels.items())))] += amount
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            hist = self.histograms.get(stage)
+            if not hist: hist = self.histograms[stage] = {'buckets': [0] * len(METRICS_BUCKETS), 'sum': 0.0, 'count': 0, 'recent': deque(maxlen=METRICS_SAMPLES)}
+            for i, bound in enumerate(METRICS_BUCKETS):
+                if seconds <= bound: hist['buckets'][i] += 1
+            hist['sum'] += seconds
+            hist['count'] += 1
+            hist['recent'].append(seconds)
+
+    @contextlib.contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try: yield
+        finally: self.observe(stage, time.perf_counter() - start)
+
+    def snapshot(self, local=False):
+        """Copies of the counters and histograms, taken under the lock; unless local, merged with the workers' last ones."""
+        with self.lock:
+            counters = dict(self.counters)
+            hists = {k: {'buckets': list(v['buckets']), 'sum': v['sum'], 'count': v['count'], 'recent': list(v['recent'])}
+                     for k, v in self.histograms.items()}
+        for result, value in media_cache.stats.items(): counters[('media_cache', (('result', result),))] = value
+        if local: return counters, hists
+        for data in list(self.remote.values()):
+            for name, labels, value in data['counters']:
+                key = (name, tuple(map(tuple, labels)))
+                counters[key] = counters.get(key, 0) + value
+            for stage, remote in data['histograms'].items():
+                hist = hists.setdefault(stage, {'buckets': [0] * len(METRICS_BUCKETS), 'sum': 0.0, 'count': 0, 'recent': []})
+                hist['buckets'] = [a + b for a, b in zip(hist['buckets'], remote['buckets'])]
+                hist['sum'] += remote['sum']
+                hist['count'] += remote['count']
+                hist['recent'] += remote['recent']
+        return counters, hists
+
+    def publish(self, worker):
+        """Stores this worker process' snapshot for the front end; blocking."""
+        counters, hists = self.snapshot(local=True)
+        data = json.dumps({'counters': [[name, labels, value] for (name, labels), value in counters.items()], 'histograms': hists})
+        db = get_db()
+        with db_lock, db:
+            db.execute("CREATE TABLE IF NOT EXISTS worker_metrics (worker INTEGER PRIMARY KEY, data TEXT NOT NULL, updated REAL)")
+            db.execute("INSERT OR REPLACE INTO worker_metrics VALUES (?, ?, ?)", (worker, data, time.time()))
+
+    def collect(self):
+        """Loads the snapshots the current worker processes published; blocking."""
+        db = get_db()
+        with db_lock, db:
+            db.execute("CREATE TABLE IF NOT EXISTS worker_metrics (worker INTEGER PRIMARY KEY, data TEXT NOT NULL, updated REAL)")
+            rows = db.execute("SELECT worker, data FROM worker_metrics WHERE worker < ?", (WORKER_COUNT,)).fetchall()
+        self.remote = {worker: json.loads(data) for worker, data in rows}
+
+    def percentiles(self, stage, *qs, hists=None):
+        if hists is None: hists = self.snapshot()[1]
+        recent = sorted(hists[stage]['recent']) if stage in hists else []
+        return [recent[min(len(recent) - 1, int(q / 100 * len(recent)))] if recent else 0.0 for q in qs]
+
+    def gauges(self):
+        return {
+            'jobs_running': len(scheduler.running),
+            'jobs_queued': sum(len(q) for q in scheduler.queues.values()),
+            'inflight_tracks': len(inflight),
+            'status_messages': len(status_renderer.states),
+            'global_cache_entries': len(global_cache.entries),
+            'media_cache_bytes': media_cache.total,
+            'uptime_seconds': int(time.time() - self.started),
+        }
+
+    def render(self):
+        fmt = lambda labels: "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}" if labels else ""
+        lines = []
+        counters, hists = self.snapshot()
+        typed = set()
+        for name, labels in sorted(counters):
+            if name not in typed: lines.append(f"# TYPE haveit_{name}_total counter")
+            typed.add(name)
+            lines.append(f"haveit_{name}_total{fmt(labels)} {counters[(name, labels)]:g}")
+        lines.append("# TYPE haveit_stage_seconds histogram")
+        for stage, hist in sorted(hists.items()):
+            for bound, n in zip(METRICS_BUCKETS, hist['buckets']):
+                lines.append(f'haveit_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {n}')
+            lines.append(f'haveit_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {hist["count"]}')
+            lines.append(f'haveit_stage_seconds_sum{{stage="{stage}"}} {hist["sum"]:.6f}')
+            lines.append(f'haveit_stage_seconds_count{{stage="{stage}"}} {hist["count"]}')
+        for name, value in self.gauges().items(): lines += [f"# TYPE haveit_{name} gauge", f"haveit_{name} {value:g}"]
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """HTML overview for the /stats command."""
+        counters, hists = self.snapshot()
+        text = "📊 <b>Stage latency</b> (p50 / p95, n)\n"
+        for stage in sorted(hists):
+            p50, p95 = self.percentiles(stage, 50, 95, hists=hists)
+            text += f"• <code>{stage}</code>: {p50:.2f}s / {p95:.2f}s ({hists[stage]['count']})\n"
+        text += "\n🔢 <b>Counters</b>\n"
+        for (name, labels), value in sorted(counters.items()):
+            label = ",".join(str(v) for _, v in labels)
+            text += f"• {name}{f' [{label}]' if label else ''}: <b>{value:g}</b>\n"
+        text += "\n⚙️ <b>Now</b>\n" + "".join(f"• {k}: <b>{v:g}</b>\n" for k, v in self.gauges().items())
+        return text
+
+metrics = Metrics()
+
+def timed(stage):
+    """Records the wall time of every call in the stage's histogram."""
+    def wrap(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def inner(*args, **kwargs):
+                with metrics.timer(stage): return await fn(*args, **kwargs)
+        else:
+            @functools.wraps(fn)
+            def inner(*args, **kwargs):
+                with metrics.timer(stage): return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+async def metrics_sync_loop(worker=None):
+    """Worker mode: each worker publishes its metrics to SQLite and the front end (worker None) collects them."""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(METRICS_SYNC_INTERVAL)
+        try:
+            if worker is None: await loop.run_in_executor(db_executor, metrics.collect)
+            else: await loop.run_in_executor(db_executor, metrics.publish, worker)
+        except Exception as e:
+            logger.error(f"Metrics sync failed: {e}")
+
+async def serve_http(reader, writer):
+    """Minimal HTTP/1.1 responder for the routes in http_routes."""
+    try:
+        request = (await asyncio.wait_for(reader.readline(), 5)).split()
+        while (await asyncio.wait_for(reader.readline(), 5)) not in (b'\r\n', b'\n', b''): pass
+        route = http_routes.get(request[1].decode().split('?')[0] if len(request) > 1 else '/')
+        status, body = route() if route else ('404 Not Found', 'not found\n')
+        data = body.encode()
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                     f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode() + data)
+        await writer.drain()
+    except Exception: pass
+    finally: writer.close()
 
-def get_user_folder(user_id):
-    path = os.path.join(BASE_DATA_DIR, str(user_id))
-    if not os.path.exists(path): os.makedirs(path, exist_ok=True)
-    return path
+def health():
+    """200 while the bot can serve jobs, 503 while the route is being rotated."""
+    if not route_manager.healthy.is_set(): return '503 Service Unavailable', 'rotating route\n'
+    return '200 OK', f"ok {len(scheduler.running)} running {sum(len(q) for q in scheduler.queues.values())} queued\n"
+
+http_routes = {'/metrics': lambda: ('200 OK', metrics.render()), '/healthz': health}
+
+class GlobalCache:
+    """
+    In-memory index of the cache channel.
+    Lookups never touch the disk, new entries are written behind in batches
+    to SQLite and the WAL is compacted periodically.
+    """
+    def __init__(self):
+        self.entries = {}
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.flush_requested = asyncio.Event()
+        self.loaded = False
+
+    def load(self):
+        db = get_db()
+        with db_lock:
+            db.execute("CREATE TABLE IF NOT EXISTS global_cache (key TEXT PRIMARY KEY, data TEXT NOT NULL, timestamp REAL)")
+            db.commit()
+            rows = db.execute("SELECT key, data FROM global_cache").fetchall()
+        with self.lock:
+            for key, data in rows:
+                try: self.entries[key] = json.loads(data)
+                except ValueError: pass
+        self.loaded = True
+        self.migrate_json()
+        logger.info(f"Global cache loaded: {len(self.entries)} entries.")
+
+    def migrate_json(self):
+        """One-time import of the legacy global_cache.json file."""
+        if not os.path.exists(CACHE_FILE): return
+        try:
+            with open(CACHE_FILE, 'r', encoding='utf-8') as f: legacy = json.load(f)
+        except: legacy = {}
+        with self.lock:
+            for key, entry in legacy.items():
+                if key not in self.entries and isinstance(entry, dict):
+                    self.entries[key] = entry
+                    self.pending[key] = entry
+        if self.flush() is not None:
+            os.replace(CACHE_FILE, CACHE_FILE + ".migrated")
+            logger.info(f"Migrated {len(legacy)} entries from {CACHE_FILE}.")
+
+    def get(self, key):
+        if not self.loaded: self.load()
+        return self.entries.get(key)
+
+    def reload(self, key):
+        """Reads an entry another worker process may have written since load(); blocking, see sync_shared_stores."""
+        if key in self.entries: return self.entries[key]
+        db = get_db()
+        with db_lock: row = db.execute("SELECT data FROM global_cache WHERE key = ?", (key,)).fetchone()
+        try: entry = json.loads(row[0]) if row else None
+        except ValueError: entry = None
+        if entry is not None:
+            with self.lock: self.entries.setdefault(key, entry)
+        return entry
+
+    def put(self, key, entry):
+        if not self.loaded: self.load()
+        with self.lock:
+            self.entries[key] = entry
+            self.pending[key] = entry
+            if len(self.pending) >= CACHE_FLUSH_BATCH: self.flush_requested.set()
+
+    def flush(self):
+        """Writes pending entries in one transaction. Returns the count, or None on failure."""
+        with self.lock:
+            batch, self.pending = self.pending, {}
+        if not batch: return 0
+        rows = [(k, json.dumps(v, ensure_ascii=False), v.get('timestamp', time.time())) for k, v in batch.items()]
+        try:
+            db = get_db()
+            with db_lock, db:
+                db.executemany("INSERT OR REPLACE INTO global_cache (key, data, timestamp) VALUES (?, ?, ?)", rows)
+            return len(rows)
+        except Exception as e:
+            logger.error(f"Cache flush failed: {e}")
+            with self.lock:
+                for k, v in batch.items(): self.pending.setdefault(k, v)
+            return None
+
+    def compact(self):
+        """Truncates the WAL. No VACUUM: it would hold db_lock, and with it the event loop, for the whole rewrite."""
+        try:
+            db = get_db()
+            with db_lock: db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        except Exception as e:
+            logger.error(f"Cache compaction failed: {e}")
+
+global_cache = GlobalCache()
+
+def save_to_global_cache(unique_key, audio_msg_id, photo_msg_id=None, **media):
+    """media: {audio,photo}_file_id, {audio,photo}_unique_id, title, performer, caption, photo_caption."""
+    global_cache.put(unique_key, {
+        'audio': audio_msg_id,
+        'photo': photo_msg_id,
+        **media,
+        'timestamp': time.time()
+    })
+
+def get_from_cache(unique_key):
+    return global_cache.get(unique_key)
+
+def media_ids(msg, kind):
+    """(file_id, file_unique_id) of a sent audio/photo message; (None, None) for channel copies."""
+    media = getattr(msg, 'audio', None) if kind == 'audio' else (getattr(msg, 'photo', None) or [None])[-1]
+    return (media.file_id, media.file_unique_id) if media else (None, None)
+
+@timed('cache_send')
+async def send_cached_media(bot, chat_id, unique_key, entry, kind):
+    """
+    Serves a cached audio or photo by file_id, without the cache-channel hop.
+    Falls back to copying the channel message if sending by ID fails, and
+    forgets IDs Telegram rejects. Flood waits and blocked chats propagate
+    without touching the cache. Returns the sent message or None, in which
+    case process_media fetches the track itself.
+    """
+    file_id = entry.get(f'{kind}_file_id')
+    if file_id:
+        try:
+            if kind == 'audio':
+                return await bot.send_audio(chat_id, file_id, title=entry.get('title'), performer=entry.get('performer'),
+                                            caption=entry.get('caption'), parse_mode=ParseMode.HTML)
+            return await bot.send_photo(chat_id, file_id, caption=entry.get('photo_caption'), parse_mode=ParseMode.HTML)
+        except (RetryAfter, Forbidden):
+            raise
+        except BadRequest as e:
+            logger.warning(f"Cached {kind} file_id rejected for {unique_key}: {e}")
+            current = global_cache.get(unique_key) or entry
+            if current.get(f'{kind}_file_id') == file_id:
+                global_cache.put(unique_key, {k: v for k, v in current.items() if k not in (f'{kind}_file_id', f'{kind}_unique_id')})
+        except TelegramError as e:
+            logger.warning(f"Sending cached {kind} for {unique_key} failed: {e}")
+    if not entry.get(kind): return None
+    try: return await bot.copy_message(chat_id, CACHE_CHANNEL_ID, entry[kind])
+    except (RetryAfter, Forbidden): raise
+    except TelegramError: return None
+
+class UserStore:
+    """
+    Profiles (destination channel) and channel send history of every user,
+    kept in memory and written behind to SQLite in batches. Replaces the
+    per-user config.json/history.json files, which are imported once.
+    History is bounded to HISTORY_MAX_PER_USER entries per user.
+    """
+    def __init__(self):
+        self.profiles = {}
+        self.history = {}
+        self.pending_profiles = {}
+        self.pending_history = {}
+        self.overflowed = set()
+        self.lock = threading.Lock()
+        self.loaded = False
+
+    def load(self):
+        db = get_db()
+        with db_lock, db:
+            db.execute("CREATE TABLE IF NOT EXISTS user_profiles (user_id INTEGER PRIMARY KEY, data TEXT NOT NULL)")
+            db.execute("CREATE TABLE IF NOT EXISTS user_history (user_id INTEGER, key TEXT, message_id INTEGER, sent_at REAL, PRIMARY KEY (user_id, key))")
+            profiles = db.execute("SELECT user_id, data FROM user_profiles").fetchall()
+            history = db.execute("SELECT user_id, key, message_id, sent_at FROM user_history ORDER BY sent_at").fetchall()
+        with self.lock:
+            for user_id, data in profiles:
+                try: self.profiles[user_id] = json.loads(data)
+                except ValueError: pass
+            for user_id, key, message_id, sent_at in history: self.history.setdefault(user_id, {})[key] = (message_id, sent_at or 0)
+        self.loaded = True
+        self.migrate_json()
+        logger.info(f"User store loaded: {len(self.profiles)} profiles, {sum(map(len, self.history.values()))} history entries.")
+
+    def migrate_json(self):
+        """One-time import of the legacy Users_Data/<user_id>/{config,history}.json files."""
+        migrated = []
+        for name in os.listdir(BASE_DATA_DIR) if os.path.isdir(BASE_DATA_DIR) else []:
+            folder = os.path.join(BASE_DATA_DIR, name)
+            if not name.lstrip('-').isdigit() or not os.path.isdir(folder): continue
+            user_id = int(name)
+            for file_name in ("config.json", "history.json"):
+                path = os.path.join(folder, file_name)
+                if not os.path.exists(path): continue
+                try:
+                    with open(path, 'r', encoding='utf-8') as f: data = json.load(f)
+                except: data = {}
+                if file_name == "config.json":
+                    if user_id not in self.profiles and data: self.set_channel(user_id, data)
+                else:
+                    for key, message_id in (data.items() if isinstance(data, dict) else ()): self.add_history(user_id, key, message_id)
+                migrated.append(path)
+        if migrated and self.flush() is not None:
+            for path in migrated: os.replace(path, path + ".migrated")
+            logger.info(f"Migrated {len(migrated)} legacy user files.")
+
+    def get_channel(self, user_id):
+        if not self.loaded: self.load()
+        return self.profiles.get(user_id)
+
+    def set_channel(self, user_id, data):
+        with self.lock:
+            self.profiles[user_id] = data
+            self.pending_profiles[user_id] = data
+
+    def delete_channel(self, user_id):
+        if not self.loaded: self.load()
+        with self.lock:
+            if self.profiles.pop(user_id, None) is None: return False
+            self.pending_profiles[user_id] = None
+        return True
+
+    def add_history(self, user_id, key, message_id):
+        with self.lock:
+            hist = self.history.setdefault(user_id, {})
+            hist.pop(key, None)
+            hist[key] = (message_id, time.time())
+            while len(hist) > HISTORY_MAX_PER_USER:
+                hist.pop(next(iter(hist)))
+                self.overflowed.add(user_id)
+            self.pending_history[(user_id, key)] = hist[key]
+
+    def reload_history(self, user_id):
+        """Replaces one user's history with the stored rows plus unflushed sends; blocking. Workers call it per job."""
+        db = get_db()
+        with db_lock: rows = db.execute("SELECT key, message_id, sent_at FROM user_history WHERE user_id = ? ORDER BY sent_at", (user_id,)).fetchall()
+        with self.lock:
+            hist = {key: (message_id, sent_at or 0) for key, message_id, sent_at in rows}
+            for (u, key), value in self.pending_history.items():
+                if u == user_id: hist[key] = value
+            self.history[user_id] = hist
+
+    def history_message(self, user_id, key, since=0):
+        """Message ID of the latest send of key, if it happened at or after since."""
+        if not self.loaded: self.load()
+        message_id, sent_at = self.history.get(user_id, {}).get(key, (None, 0))
+        return message_id if sent_at >= since else None
+
+    def flush(self):
+        """Writes pending changes in one transaction. Returns the count, or None on failure."""
+        with self.lock:
+            profiles, self.pending_profiles = self.pending_profiles, {}
+            history, self.pending_history = self.pending_history, {}
+            overflowed, self.overflowed = self.overflowed, set()
+        if not profiles and not history: return 0
+        try:
+            db = get_db()
+            with db_lock, db:
+                db.executemany("INSERT OR REPLACE INTO user_profiles VALUES (?, ?)",
+                               [(u, json.dumps(d, ensure_ascii=False)) for u, d in profiles.items() if d is not None])
+                db.executemany("DELETE FROM user_profiles WHERE user_id = ?", [(u,) for u, d in profiles.items() if d is None])
+                db.executemany("INSERT OR REPLACE INTO user_history VALUES (?, ?, ?, ?)",
+                               [(u, k, m, t) for (u, k), (m, t) in history.items()])
+                db.executemany("DELETE FROM user_history WHERE user_id = ? AND key NOT IN "
+                               "(SELECT key FROM user_history WHERE user_id = ? ORDER BY sent_at DESC LIMIT ?)",
+                               [(u, u, HISTORY_MAX_PER_USER) for u in overflowed])
+            return len(profiles) + len(history)
+        except Exception as e:
+            logger.error(f"User store flush failed: {e}")
+            with self.lock:
+                for u, d in profiles.items(): self.pending_profiles.setdefault(u, d)
+                for k, v in history.items(): self.pending_history.setdefault(k, v)
+                self.overflowed |= overflowed
+            return None
+
+user_store = UserStore()
 
 def save_user_channel(user_id, channel_id, channel_title, channel_username=None):
-    user_path = get_user_folder(user_id)
-    data = {
+    if not user_store.loaded: user_store.load()
+    user_store.set_channel(user_id, {
         "channel_id": channel_id,
         "channel_title": channel_title,
         "channel_username": channel_username,
         "set_at": time.time()
-    }
-    with open(os.path.join(user_path, "config.json"), 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=4, ensure_ascii=False)
+    })
 
 def get_user_channel(user_id):
-    config_file = os.path.join(get_user_folder(user_id), "config.json")
-    if os.path.exists(config_file):
-        try:
-            with open(config_file, 'r', encoding='utf-8') as f: return json.load(f)
-        except: return None
-    return None
+    return user_store.get_channel(user_id)
 
 def delete_user_channel(user_id):
-    config_file = os.path.join(get_user_folder(user_id), "config.json")
-    if os.path.exists(config_file):
-        os.remove(config_file)
-        return True
-    return False
+    return user_store.delete_channel(user_id)
 
-def load_global_cache():
-    if os.path.exists(CACHE_FILE):
-        try:
-            with open(CACHE_FILE, 'r', encoding='utf-8') as f: return json.load(f)
-        except: return {}
-    return {}
+def save_to_history(user_id, unique_key, message_id):
+    """Saves song signature and channel message ID"""
+    if not user_store.loaded: user_store.load()
+    user_store.add_history(user_id, unique_key, message_id)
 
-def save_to_global_cache(unique_key, audio_msg_id, photo_msg_id=None):
-    cache = load_global_cache()
-    cache[unique_key] = {
-        'audio': audio_msg_id,
-        'photo': photo_msg_id,
-        'timestamp': time.time()
-    }
-    with open(CACHE_FILE, 'w', encoding='utf-8') as f:
-        json.dump(cache, f, ensure_ascii=False)
+def get_history_message(user_id, unique_key):
+    """Message ID of a track the user already sent to their current channel, or None."""
+    ch = get_user_channel(user_id)
+    return user_store.history_message(user_id, unique_key, since=ch.get('set_at', 0)) if ch else None
 
-def get_from_cache(unique_key):
-    cache = load_global_cache()
-    return cache.get(unique_key)
+async def cache_maintenance_loop():
+    loop = asyncio.get_running_loop()
+    last_compact = time.time()
+    while True:
+        try: await asyncio.wait_for(global_cache.flush_requested.wait(), CACHE_FLUSH_INTERVAL)
+        except asyncio.TimeoutError: pass
+        global_cache.flush_requested.clear()
+        await loop.run_in_executor(db_executor, global_cache.flush)
+        await loop.run_in_executor(db_executor, user_store.flush)
+        await loop.run_in_executor(db_executor, media_cache.flush)
+        await loop.run_in_executor(db_executor, track_index.flush)
+        await loop.run_in_executor(db_executor, spotify_resolver.flush)
+        if time.time() - last_compact > CACHE_COMPACT_INTERVAL:
+            last_compact = time.time()
+            await loop.run_in_executor(db_executor, global_cache.compact)
+            if WORKER_COUNT:
+                await loop.run_in_executor(db_executor, job_queue.trim)
+                await loop.run_in_executor(db_executor, shared_budget.trim)
 
 def human_readable_size(size):
     if not size: return "..."
@@ -116,44 +674,412 @@ def human_readable_time(seconds):
     except: return "..."
 
 
-def rotate_warp_ip():
+class WarpRouteManager:
     """
-    IP Warp spins in a loop until a healthy connection is established.
+    Owns the Warp tunnel. Only one rotation runs at a time, with bounded
+    exponential backoff; jobs that hit a broken route wait on `healthy`
+    instead of tearing the tunnel down on their own.
     """
-    attempt = 1
-    while True:
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.healthy = asyncio.Event()
+        self.healthy.set()
+        self.generation = 0
+
+    async def warp(self, *args):
         try:
-            subprocess.run(['warp-cli', 'disconnect'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
-            time.sleep(3)
-            
-            subprocess.run(['warp-cli', 'connect'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
-            time.sleep(6)
-            
-            requests.get("https://www.google.com", proxies={'http': PROXY_URL, 'https': PROXY_URL}, timeout=5)
-            
-            print(f"✅ [AUTO-HEAL] New IP Assigned Successfully after {attempt} attempts.\n")
+            proc = await asyncio.create_subprocess_exec(WARP_CLI, *args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            await proc.wait()
+        except OSError as e:
+            logger.error(f"warp-cli {' '.join(args)} failed: {e}")
+
+    async def probe(self):
+        def check():
+            requests.get(ROUTE_PROBE_URL, proxies={'http': PROXY_URL, 'https': PROXY_URL}, timeout=5)
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, check)
             return True
-
+        except Exception:
+            return False
+
+    async def wait_healthy(self):
+        await self.healthy.wait()
+
+    async def rotate(self, seen_generation=None):
+        """
+        Rotates the route. If another rotation finished after the caller saw
+        `seen_generation`, that result is reused instead of rotating again.
+        """
+        if seen_generation is None: seen_generation = self.generation
+        async with self.lock:
+            if self.generation != seen_generation: return True
+            self.healthy.clear()
+            try:
+                for attempt in range(1, ROUTE_MAX_ATTEMPTS + 1):
+                    metrics.inc('warp_rotations')
+                    await self.warp('disconnect')
+                    await asyncio.sleep(WARP_DISCONNECT_WAIT)
+                    await self.warp('connect')
+                    await asyncio.sleep(WARP_CONNECT_WAIT)
+                    if await self.probe():
+                        print(f"✅ [AUTO-HEAL] New IP Assigned Successfully after {attempt} attempts.\n")
+                        return True
+                    if attempt < ROUTE_MAX_ATTEMPTS:
+                        delay = min(ROUTE_BACKOFF_BASE * 2 ** (attempt - 1), ROUTE_BACKOFF_MAX)
+                        logger.error(f"⚠️ IP Rotation failed (Attempt {attempt}), retrying in {delay}s")
+                        await asyncio.sleep(delay)
+                logger.error(f"⚠️ IP Rotation gave up after {ROUTE_MAX_ATTEMPTS} attempts.")
+                metrics.inc('warp_failures')
+                return False
+            finally:
+                self.generation += 1
+                self.healthy.set()
+
+    async def health_loop(self):
+        while True:
+            await asyncio.sleep(ROUTE_HEALTH_INTERVAL)
+            if self.lock.locked(): continue
+            if not await self.probe():
+                logger.warning("Route health probe failed, rotating.")
+                await self.rotate()
+
+route_manager = WarpRouteManager()
+
+class HttpPool:
+    """
+    Shared async HTTP client for the metadata and lyrics scrapers: keep-alive
+    pools, HTTP/2 when h2 is installed, per-host concurrency limits and timeouts.
+    """
+    def __init__(self):
+        self.client = None
+        self.host_limits = {}
+
+    def get_client(self):
+        if self.client is None or self.client.is_closed:
+            self.client = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                headers={'User-Agent': 'Mozilla/5.0'},
+                limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_CONNECTIONS, keepalive_expiry=60),
+                follow_redirects=True
+            )
+        return self.client
+
+    def limiter(self, host):
+        if host not in self.host_limits:
+            self.host_limits[host] = asyncio.Semaphore(HTTP_HOST_LIMITS.get(host, HTTP_DEFAULT_HOST_LIMIT))
+        return self.host_limits[host]
+
+    async def get(self, url, **kwargs):
+        host = httpx.URL(url).host
+        kwargs.setdefault('timeout', HTTP_HOST_TIMEOUTS.get(host, HTTP_DEFAULT_TIMEOUT))
+        async with self.limiter(host):
+            return await self.get_client().get(url, **kwargs)
+
+    @contextlib.asynccontextmanager
+    async def stream(self, url, **kwargs):
+        host = httpx.URL(url).host
+        kwargs.setdefault('timeout', HTTP_HOST_TIMEOUTS.get(host, HTTP_DEFAULT_TIMEOUT))
+        async with self.limiter(host):
+            async with self.get_client().stream('GET', url, **kwargs) as resp:
+                yield resp
+
+    async def close(self):
+        if self.client: await self.client.aclose()
+
+http_pool = HttpPool()
+
+def retry_after_seconds(err):
+    ra = err.retry_after
+    return ra.total_seconds() if hasattr(ra, 'total_seconds') else float(ra)
+
+class TokenBucket:
+    __slots__ = ('rate', 'capacity', 'tokens', 'stamp', 'paused_until')
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.stamp = time.monotonic()
+        self.paused_until = 0
+
+    def wait(self, now):
+        """Seconds until a token is available (0 means now)."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if now < self.paused_until: return self.paused_until - now
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def idle(self, now):
+        return self.wait(now) == 0 and self.tokens >= self.capacity
+
+class SharedBudget:
+    """
+    Worker mode: the global and per-chat token buckets of OutboundLimiter
+    kept in SQLite, so the front end and every worker draw from one Telegram
+    budget instead of each process getting the full limits. Flood waits are
+    shared the same way.
+    """
+    def __init__(self):
+        self.ready = False
+
+    def load(self):
+        db = get_db()
+        with db_lock, db:
+            db.execute("CREATE TABLE IF NOT EXISTS tg_budget (key TEXT PRIMARY KEY, tokens REAL NOT NULL, stamp REAL NOT NULL, paused_until REAL NOT NULL)")
+        self.ready = True
+
+    @staticmethod
+    def key(chat_id):
+        return 'global' if chat_id is None else str(chat_id)
+
+    @staticmethod
+    def limits(key):
+        if key == 'global': return TG_GLOBAL_RATE, TG_GLOBAL_RATE
+        try: group = int(key) < 0
+        except ValueError: group = True
+        return TG_GROUP_RATE if group else TG_CHAT_RATE
+
+    def take(self, chat_id):
+        """Takes a global and a chat token in one transaction; blocking. Returns 0, or seconds to wait before asking again."""
+        if not self.ready: self.load()
+        keys = list(dict.fromkeys(['global', self.key(chat_id)]))
+        now = time.time()
+        db = get_db()
+        with db_lock, db:
+            db.execute("BEGIN IMMEDIATE")
+            rows = {k: (t, s, p) for k, t, s, p in db.execute(
+                f"SELECT key, tokens, stamp, paused_until FROM tg_budget WHERE key IN ({','.join('?' * len(keys))})", keys)}
+            buckets, wait = {}, 0
+            for key in keys:
+                rate, capacity = self.limits(key)
+                tokens, stamp, paused = rows.get(key, (capacity, now, 0))
+                tokens = min(capacity, tokens + max(0, now - stamp) * rate)
+                buckets[key] = [tokens, paused]
+                wait = max(wait, paused - now, 0 if tokens >= 1 else (1 - tokens) / rate)
+            if not wait:
+                for bucket in buckets.values(): bucket[0] -= 1
+            db.executemany("INSERT OR REPLACE INTO tg_budget VALUES (?, ?, ?, ?)", [(k, t, now, p) for k, (t, p) in buckets.items()])
+        return wait
+
+    def pause(self, chat_id, seconds):
+        """Holds every process' sends to chat_id for a flood wait; blocking."""
+        if not self.ready: self.load()
+        now = time.time()
+        db = get_db()
+        with db_lock, db:
+            db.execute("INSERT INTO tg_budget VALUES (?, 0, ?, ?) ON CONFLICT (key) DO UPDATE SET paused_until = MAX(paused_until, excluded.paused_until)",
+                       (self.key(chat_id), now, now + seconds))
+
+    def trim(self):
+        """Drops the buckets of chats that have been idle for an hour."""
+        if not self.ready: self.load()
+        now = time.time()
+        db = get_db()
+        with db_lock, db:
+            db.execute("DELETE FROM tg_budget WHERE key != 'global' AND stamp < ? AND paused_until < ?", (now - 3600, now))
+
+shared_budget = SharedBudget()
+
+class OutboundLimiter(BaseRateLimiter):
+    """
+    Outbound Bot API layer plugged into PTB's rate_limiter slot. Calls listed
+    in TG_LANES wait until both the global and the per-chat token bucket allow
+    them, and are released in lane order (deliveries, then messages and
+    deletes, then edits). RetryAfter pauses the chat's bucket and the call is
+    retried with backoff; edits are not retried because status_renderer
+    re-sends the latest text anyway. Other endpoints pass straight through.
+    With HAVEIT_WORKERS set, a granted call also takes its tokens from
+    shared_budget, which caps the bot's processes together.
+    """
+    def __init__(self):
+        self.shared = WORKER_COUNT > 0
+        self.global_bucket = TokenBucket(TG_GLOBAL_RATE, TG_GLOBAL_RATE)
+        self.chats = {}
+        self.waiting = []
+        self.seq = itertools.count()
+        self.wakeup = None
+        self.dispatcher = None
+        self.stats = {'sent': 0, 'retries': 0, 'flood': 0}
+
+    async def initialize(self):
+        if self.dispatcher: return
+        self.wakeup = asyncio.Event()
+        self.dispatcher = asyncio.create_task(self.dispatch_loop())
+
+    async def shutdown(self):
+        if self.dispatcher: self.dispatcher.cancel()
+        self.dispatcher = None
+        for entry in self.waiting: entry[3].cancel()
+        self.waiting.clear()
+
+    def bucket(self, chat_id):
+        if chat_id is None: return self.global_bucket
+        b = self.chats.get(chat_id)
+        if not b:
+            try: group = int(chat_id) < 0
+            except (TypeError, ValueError): group = True
+            b = self.chats[chat_id] = TokenBucket(*(TG_GROUP_RATE if group else TG_CHAT_RATE))
+        return b
+
+    def grant_next(self, now):
+        """Releases the best waiting call both buckets allow; returns seconds until the next attempt."""
+        wait = self.global_bucket.wait(now)
+        if wait: return wait
+        self.waiting = [e for e in self.waiting if not e[3].done()]
+        wait = 1.0
+        for entry in sorted(self.waiting, key=lambda e: e[:2]):
+            bucket = self.bucket(entry[2])
+            w = bucket.wait(now)
+            if w:
+                wait = min(wait, w)
+                continue
+            self.global_bucket.tokens -= 1
+            if bucket is not self.global_bucket: bucket.tokens -= 1
+            self.waiting.remove(entry)
+            entry[3].set_result(None)
+            return 0
+        if len(self.chats) > 1000:
+            busy = {e[2] for e in self.waiting}
+            for chat_id in [c for c, b in self.chats.items() if c not in busy and b.idle(now)]: del self.chats[chat_id]
+        return wait
+
+    async def dispatch_loop(self):
+        while True:
+            self.wakeup.clear()
+            if not self.waiting:
+                await self.wakeup.wait()
+                continue
+            wait = self.grant_next(time.monotonic())
+            if wait:
+                try: await asyncio.wait_for(self.wakeup.wait(), wait)
+                except asyncio.TimeoutError: pass
+
+    async def acquire(self, lane, chat_id):
+        if not self.dispatcher: await self.initialize()
+        fut = asyncio.get_running_loop().create_future()
+        self.waiting.append((lane, next(self.seq), chat_id, fut))
+        self.wakeup.set()
+        await fut
+
+    async def take_shared(self, chat_id):
+        loop = asyncio.get_running_loop()
+        while True:
+            wait = await loop.run_in_executor(db_executor, shared_budget.take, chat_id)
+            if not wait: return
+            await asyncio.sleep(wait)
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        lane = TG_LANES.get(endpoint)
+        if lane is None: return await callback(*args, **kwargs)
+        chat_id = data.get('chat_id')
+        retries = rate_limit_args if isinstance(rate_limit_args, int) else (0 if lane == TG_LANE_EDIT else TG_MAX_RETRIES)
+        attempt = 0
+        while True:
+            await self.acquire(lane, chat_id)
+            if self.shared: await self.take_shared(chat_id)
+            try:
+                result = await callback(*args, **kwargs)
+                self.stats['sent'] += 1
+                return result
+            except RetryAfter as e:
+                self.stats['flood'] += 1
+                metrics.inc('telegram_flood', endpoint=endpoint)
+                bucket = self.bucket(chat_id)
+                bucket.paused_until = max(bucket.paused_until, time.monotonic() + retry_after_seconds(e))
+                if self.shared: await asyncio.get_running_loop().run_in_executor(db_executor, shared_budget.pause, chat_id, retry_after_seconds(e))
+                if attempt >= retries: raise
+                attempt += 1
+                self.stats['retries'] += 1
+                metrics.inc('retries', stage='telegram')
+                logger.warning(f"Flood limit on {endpoint} for {chat_id}, retry {attempt}/{retries} in {retry_after_seconds(e)}s")
+                await asyncio.sleep(TG_RETRY_BACKOFF * 2 ** (attempt - 1))
+
+def parse_spotify_title(full):
+    full = html.unescape(full).strip().replace('| Spotify', '').strip()
+    for sep in (" - song and lyrics by ", " - song by "):
+        if sep in full: return full.split(sep)[0], full.split(sep)[1]
+    if " by " in full: return full.split(" by ")[0], full.split(" by ")[-1]
+    return full, ""
+
+def spotify_track_id(url):
+    match = SPOTIFY_TRACK_RE.search(url or "")
+    return match.group(1) if match else None
+
+class SpotifyResolver:
+    """
+    Spotify track metadata by track ID. Only the page head is read (the
+    response is closed once <title> arrives) and results are cached in
+    memory and written behind to SQLite, so every open/intl-xx URL variant
+    of a track hits.
+    """
+    def __init__(self):
+        self.tracks = {}
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.ready = False
+
+    def load(self):
+        db = get_db()
+        with db_lock, db:
+            db.execute("CREATE TABLE IF NOT EXISTS spotify_tracks (track_id TEXT PRIMARY KEY, song TEXT, artist TEXT, resolved_at REAL)")
+            rows = db.execute("SELECT track_id, song, artist FROM spotify_tracks").fetchall()
+        self.tracks = {tid: (song, artist) for tid, song, artist in rows}
+        self.ready = True
+
+    def remember(self, track_id, song, artist):
+        self.tracks[track_id] = (song, artist)
+        with self.lock: self.pending[track_id] = (song, artist, time.time())
+
+    def flush(self):
+        with self.lock: batch, self.pending = self.pending, {}
+        if not batch or not self.ready: return
+        try:
+            db = get_db()
+            with db_lock, db:
+                db.executemany("INSERT OR REPLACE INTO spotify_tracks VALUES (?, ?, ?, ?)", [(t, *v) for t, v in batch.items()])
+        except Exception as e:
+            logger.error(f"Spotify cache write failed: {e}")
+            with self.lock:
+                for t, v in batch.items(): self.pending.setdefault(t, v)
+
+    async def fetch_title(self, url):
+        buf = b""
+        async with http_pool.stream(url) as resp:
+            if resp.status_code != 200: return None
+            async for chunk in resp.aiter_bytes():
+                buf += chunk
+                match = SPOTIFY_TITLE_RE.search(buf)
+                if match: return match.group(1).decode('utf-8', errors='ignore')
+                if b"</head>" in buf or len(buf) > SPOTIFY_HEAD_LIMIT: break
+        return None
+
+    async def resolve(self, url):
+        """Returns (song, artist) or (None, None)."""
+        if not self.ready: await asyncio.get_running_loop().run_in_executor(db_executor, self.load)
+        track_id = spotify_track_id(url)
+        if track_id and track_id in self.tracks: return self.tracks[track_id]
+        target = f"https://open.spotify.com/track/{track_id}" if track_id else url
+        try:
+            title = await self.fetch_title(target)
         except Exception as e:
-            logger.error(f"⚠️ IP Rotation failed (Attempt {attempt}): {e}")
-            attempt += 1
-            time.sleep(10)
+            logger.error(f"Spotify resolve failed: {e}")
+            title = None
+        if not title: return None, None
+        song, artist = parse_spotify_title(title)
+        if track_id and song: self.remember(track_id, song, artist)
+        return song, artist
 
-def get_spotify_metadata(url):
-    try:
-        headers = {'User-Agent': 'Mozilla/5.0'}
-        response = requests.get(url, headers=headers, timeout=10)
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.content, 'html.parser')
-            title_tag = soup.find('title')
-            if title_tag:
-                full = title_tag.text.strip().replace('| Spotify', '')
-                if " - song by " in full: return full.split(" - song by ")[0], full.split(" - song by ")[1]
-                elif " by " in full: return full.split(" by ")[0], full.split(" by ")[-1]
-                return full, ""
-    except: pass
-    return None, None
+    async def resolve_many(self, urls):
+        """Batch API: resolves several track URLs concurrently, in input order."""
+        return await asyncio.gather(*(self.resolve(u) for u in urls))
+
+spotify_resolver = SpotifyResolver()
 
+@timed('spotify')
+async def get_spotify_metadata(url):
+    return await spotify_resolver.resolve(url)
+
+@timed('search')
 def smart_find_best_match(song_name, artist_name, ydl_opts_base):
     """
     Algorithm V4 (Linear Popularity):
@@ -163,34 +1089,50 @@ def smart_find_best_match(song_name, artist_name, ydl_opts_base):
     This makes the original version win over fakes!
     """
     search_query = f"{artist_name} - {song_name}"
-    opts = ydl_opts_base.copy()
-    opts['extract_flat'] = True
-    
-    with yt_dlp.YoutubeDL(opts) as ydl:
-        try: res = ydl.extract_info(f"ytsearch10:{search_query}", download=False)
-        except: return None
-    
-    if not res or 'entries' not in res: return None
-    candidates = res['entries']
-    
-    best_video = None
-    highest_score = -500 
-    
-    target_clean = f"{artist_name} {song_name}".lower()
-    artist_lower = artist_name.lower()
+    candidates = search_cache.get(search_query)
 
-    for vid in candidates:
-        if not vid: continue
+    if candidates is None:
+        opts = ydl_opts_base.copy()
+        opts['extract_flat'] = True
         
-        vid_title = vid.get('title', '')
-        vid_channel = vid.get('uploader', '') or vid.get('channel', '')
-        view_count = vid.get('view_count', 0) or 0
-        duration = vid.get('duration', 0)
+        with ydl_pool.acquire(opts) as ydl:
+            try: res = ydl.extract_info(f"ytsearch10:{search_query}", download=False)
+            except: return None
         
-        score = 0
+        if not res or 'entries' not in res: return None
+        candidates = [slim_candidate(vid) for vid in res['entries'] if vid]
+        search_cache.put(search_query, candidates)
+
+    return pick_best_candidate(candidates, song_name, artist_name)
+
+def slim_candidate(vid):
+    return {k: vid.get(k) for k in ('id', 'url', 'title', 'uploader', 'channel', 'view_count', 'duration')}
+
+def score_candidates(candidates, song_name, artist_name):
+    """
+    V4 scores for all candidates at once: title similarity is one batched
+    rapidfuzz call (same numbers as thefuzz.token_set_ratio), the rest are
+    plain per-candidate weights.
+    """
+    target_clean = f"{artist_name} {song_name}".lower()
+    artist_lower = artist_name.lower()
+    titles_low = [(vid.get('title') or '').lower() for vid in candidates]
+
+    similarities = [0] * len(candidates)
+    target_proc = fuzz_utils.full_process(target_clean, force_ascii=True)
+    matches = rf_process.extract(target_proc, [fuzz_utils.full_process(t, force_ascii=True) for t in titles_low],
+                                 scorer=rf_fuzz.token_set_ratio, processor=None, limit=None)
+    for _, ratio, idx in matches: similarities[idx] = int(round(ratio))
+
+    remix_ok = "remix" in target_clean
+    live_ok = "live" in target_clean
+    scores = []
+    for vid, vid_title_low, similarity in zip(candidates, titles_low, similarities):
+        vid_channel = vid.get('uploader') or vid.get('channel') or ''
+        view_count = vid.get('view_count') or 0
+        duration = vid.get('duration') or 0
         
-        popularity_score = min(view_count / 1000000, 80)
-        score += popularity_score
+        score = min(view_count / 1000000, 80)
         
         if " - Topic" in vid_channel: 
             score += 50 
@@ -199,26 +1141,74 @@ def smart_find_best_match(song_name, artist_name, ydl_opts_base):
         elif "VEVO" in vid_channel.upper():
             score += 30
             
-        similarity = fuzz.token_set_ratio(target_clean, vid_title.lower())
         score += (similarity * 0.5) 
         
         if duration > 600: score -= 50
         if duration < 90: score -= 20 
         
-        vid_title_low = vid_title.lower()
-        if "remix" in vid_title_low and "remix" not in target_clean: score -= 100
+        if "remix" in vid_title_low and not remix_ok: score -= 100
         if "cover" in vid_title_low: score -= 100
-        if "live" in vid_title_low and "live" not in target_clean: score -= 50
+        if "live" in vid_title_low and not live_ok: score -= 50
         
         if "official video" in vid_title_low or "official music video" in vid_title_low:
             score += 15
 
-        if score > highest_score:
-            highest_score = score
-            best_video = vid
+        scores.append(score)
+    return scores
 
-    if highest_score < 10 and candidates: return candidates[0].get('url')
-    return best_video.get('url') if best_video else None
+def pick_best_candidate(candidates, song_name, artist_name):
+    candidates = [vid for vid in candidates if vid]
+    if not candidates: return None
+    scores = score_candidates(candidates, song_name, artist_name)
+    best = max(range(len(candidates)), key=lambda i: (scores[i], -i))
+    if scores[best] < 10: return candidates[0].get('url')
+    return candidates[best].get('url')
+
+class SearchCache:
+    """
+    ytsearch candidates keyed on the artist/title query, kept in SQLite for
+    SEARCH_CACHE_TTL; the table is trimmed to SEARCH_CACHE_MAX rows.
+    """
+    def __init__(self):
+        self.ready = False
+        self.writes = 0
+
+    def ensure(self):
+        db = get_db()
+        if not self.ready:
+            with db_lock, db:
+                db.execute("CREATE TABLE IF NOT EXISTS search_cache (query TEXT PRIMARY KEY, candidates TEXT, created_at REAL)")
+                db.execute("CREATE INDEX IF NOT EXISTS search_cache_created ON search_cache (created_at)")
+            self.ready = True
+        return db
+
+    def get(self, query):
+        try:
+            db = self.ensure()
+            with db_lock:
+                row = db.execute("SELECT candidates FROM search_cache WHERE query = ? AND created_at > ?",
+                                 (query.lower(), time.time() - SEARCH_CACHE_TTL)).fetchone()
+            return json.loads(row[0]) if row else None
+        except Exception as e:
+            logger.error(f"Search cache read failed: {e}")
+            return None
+
+    def put(self, query, candidates):
+        try:
+            db = self.ensure()
+            now = time.time()
+            with db_lock, db:
+                db.execute("INSERT OR REPLACE INTO search_cache VALUES (?, ?, ?)", (query.lower(), json.dumps(candidates, ensure_ascii=False), now))
+                self.writes += 1
+                if self.writes % CACHE_TRIM_EVERY == 1: self.trim(db, now)
+        except Exception as e:
+            logger.error(f"Search cache write failed: {e}")
+
+    def trim(self, db, now):
+        db.execute("DELETE FROM search_cache WHERE created_at <= ?", (now - SEARCH_CACHE_TTL,))
+        db.execute("DELETE FROM search_cache WHERE query IN (SELECT query FROM search_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?)", (SEARCH_CACHE_MAX,))
+
+search_cache = SearchCache()
 
 
 def clean_ansi(text):
@@ -254,7 +1244,8 @@ START_TEXT = (
     "I am here to convert your requests into high-quality audio files instantly.\n\n"
     "<b>🚀 How to use me:</b>\n"
     "1️⃣ <b>Just Search:</b> Type <code>Song Name - Artist</code> (e.g., <i>Mockingbird - Eminem</i>).\n"
-    "2️⃣ <b>Send a Link:</b> YouTube, Spotify, or SoundCloud URLs.\n\n"
+    "2️⃣ <b>Send a Link:</b> YouTube, Spotify, or SoundCloud URLs.\n"
+    "3️⃣ <b>Batch:</b> Playlists, albums or several links in one message.\n\n"
     "<b>💎 Core Features:</b>\n"
     "├ ⚡️ Quality: <b>320kbps MP3</b>\n"
     "├ 🔍 Engine: <b>Smart Auto-Search</b>\n"
@@ -273,6 +1264,10 @@ async def start(update: Update, context: CallbackContext) -> None:
 async def settings_command(update: Update, context: CallbackContext):
     await show_settings_menu(update, context, True)
 
+async def stats_command(update: Update, context: CallbackContext):
+    if update.effective_user.id not in ADMIN_CHAT_IDS: return
+    await update.message.reply_text(metrics.summary(), parse_mode=ParseMode.HTML)
+
 async def show_settings_menu(update: Update, context: CallbackContext, is_new=False):
     user_id = update.effective_user.id
     ch = get_user_channel(user_id)
@@ -357,9 +1352,9 @@ async def callback_handler(update: Update, context: CallbackContext):
                 
                 target_audio = q.message.reply_to_message.audio if q.message.reply_to_message else None
                 if target_audio:
-                    clean_a = clean_text_for_search(target_audio.performer or "")
-                    clean_t = clean_text_for_search(target_audio.title or "")
-                    unique_key = f"{clean_a}_{clean_t}"
+                    audio_key = make_track_key(target_audio.performer, target_audio.title)
+                    await sync_shared_stores([f"key:{audio_key}"])
+                    unique_key = track_index.resolve([f"key:{audio_key}"]) or audio_key
                     save_to_history(user_id, unique_key, sent_msg.message_id)
 
                 await q.answer("✅ Sent!")
@@ -380,6 +1375,36 @@ async def callback_handler(update: Update, context: CallbackContext):
             logger.error(f"Send Error: {e}")
             await q.answer("❌ Error sending to channel.", show_alert=True)
 
+    elif data.startswith('send_batch_'):
+        batch_id = int(data.split('_')[2])
+        items = batch_results.get(batch_id)
+        if not items and WORKER_COUNT: items = ((await asyncio.get_running_loop().run_in_executor(db_executor, job_queue.get, batch_id)) or {}).get('result')
+        ch = get_user_channel(user_id)
+        if not items or not ch:
+            await q.answer("❌ Batch expired or channel not found.", show_alert=True)
+            return
+        await q.answer("📤 Sending batch...")
+        await q.edit_message_text(f"📤 <b>Sending {len(items)} tracks to channel...</b>", parse_mode=ParseMode.HTML)
+        first_msg_id = None
+        sent = 0
+        for audio_id, photo_id, unique_key in items:
+            try:
+                if photo_id:
+                    try: await context.bot.copy_message(chat_id=ch['channel_id'], from_chat_id=q.message.chat_id, message_id=photo_id)
+                    except Exception as e: logger.error(f"Banner Send Error: {e}")
+                sent_msg = await context.bot.copy_message(chat_id=ch['channel_id'], from_chat_id=q.message.chat_id, message_id=audio_id)
+                if unique_key: save_to_history(user_id, unique_key, sent_msg.message_id)
+                first_msg_id = first_msg_id or sent_msg.message_id
+                sent += 1
+            except Exception as e:
+                logger.error(f"Batch Send Error: {e}")
+        kb = [[InlineKeyboardButton("🔗 View in Channel", url=get_message_link(ch['channel_id'], first_msg_id, ch.get('channel_username')))]] if first_msg_id else []
+        await q.edit_message_text(
+            f"✅ <b>{sent}/{len(items)} tracks sent to channel:</b>\n📢 {html.escape(ch['channel_title'])}",
+            reply_markup=InlineKeyboardMarkup(kb) if kb else None,
+            parse_mode=ParseMode.HTML
+        )
+
     elif data.startswith('restore_menu_'):
         parts = data.split('_')
         aid = parts[2]
@@ -412,7 +1437,15 @@ async def callback_handler(update: Update, context: CallbackContext):
         if chat_id in user_states:
             user_states[chat_id]['running'] = False
             await q.answer("🛑 Requesting cancel...")
-            await q.edit_message_text("⛔️ <b>Operation cancelled by user.</b>", parse_mode=ParseMode.HTML)
+            await safe_edit(q.message, "⛔️ <b>Operation cancelled by user.</b>", chat_id, remove_keyboard=True)
+
+    elif data.startswith('cancel_q_'):
+        job = scheduler.cancel(int(data.split('_')[2]))
+        if job:
+            await q.answer("🗑 Removed from queue.")
+            await safe_edit(q.message, "⛔️ <b>Removed from queue.</b>", job.chat_id, remove_keyboard=True)
+        else:
+            await q.answer("Already started or finished.")
 
     elif data.startswith('get_lyrics_'):
         try:
@@ -432,9 +1465,7 @@ async def callback_handler(update: Update, context: CallbackContext):
             raw_artist = target_audio.performer or ""
             raw_title = target_audio.title or ""
             
-            lyrics, source = await asyncio.get_running_loop().run_in_executor(
-                None, get_lyrics_smart, raw_artist, raw_title
-            )
+            lyrics, source = await get_lyrics_smart(raw_artist, raw_title)
             
             if lyrics:
                 header = f"🎤 <b>{html.escape(raw_title)}</b>\n\n"
@@ -455,6 +1486,12 @@ async def callback_handler(update: Update, context: CallbackContext):
                         parse_mode=ParseMode.HTML,
                         reply_to_message_id=audio_msg_id
                     )
+            elif source == LOOKUP_ERROR:
+                await context.bot.send_message(
+                    chat_id=chat_id,
+                    text="⚠️ Lyrics services are not reachable right now. Please try again later.",
+                    reply_to_message_id=audio_msg_id
+                )
             else:
                 clean_q = clean_text_for_search(raw_title)
                 await context.bot.send_message(
@@ -476,22 +1513,268 @@ async def handle_message(update: Update, context: CallbackContext):
     if chat_id not in ALLOWED_CHAT_IDS: return
     
     text = msg.text.strip()
-    platform = None
-    if "youtube.com" in text or "youtu.be" in text: platform = "YouTube"
-    elif "soundcloud.com" in text: platform = "SoundCloud"
-    elif "spotify.com" in text: platform = "Spotify"
+    platform = detect_platform(text)
+    links = [l for l in LINK_RE.findall(text) if detect_platform(l)]
     
     if platform:
-        if chat_id in active_chats:
-            await msg.reply_text('⚠️ You have an active process. Please wait.')
+        if scheduler.queued_count(chat_id) >= MAX_QUEUED_PER_CHAT:
+            await msg.reply_text('⚠️ Your queue is full. Please wait.')
             return
-        active_chats.add(chat_id)
-        user_states[chat_id] = {'running': True, 'start_time': time.time()}
-        kb = [[InlineKeyboardButton("Cancel Operation ❌", callback_data=f'cancel_dl_{chat_id}')]]
-        status = await msg.reply_text(f"🔍 <b>Checking {platform} link...</b>", parse_mode=ParseMode.HTML, reply_markup=InlineKeyboardMarkup(kb))
-        asyncio.create_task(process_media(text, platform, chat_id, status, context, msg))
+        if len(links) > 1 or (links and is_collection_link(links[0])):
+            status = await msg.reply_text("📦 <b>Batch received...</b>", parse_mode=ParseMode.HTML)
+            scheduler.submit(chat_id, status, "Batch", lambda: run_job('batch', chat_id, status, context, msg, links=links))
+            return
+        url = links[0] if links else text
+        status = await msg.reply_text(f"🔍 <b>Checking {platform} link...</b>", parse_mode=ParseMode.HTML)
+        scheduler.submit(chat_id, status, platform, lambda: run_job('media', chat_id, status, context, msg, url=url, platform=platform))
+
+def detect_platform(text):
+    if "youtube.com" in text or "youtu.be" in text: return "YouTube"
+    elif "soundcloud.com" in text: return "SoundCloud"
+    elif "spotify.com" in text: return "Spotify"
+    return None
+
+def is_collection_link(link):
+    return bool(re.search(r'youtube\.com/playlist\?|soundcloud\.com/[^/\s]+/sets/|spotify\.com/(?:intl-[a-zA-Z-]+/)?(?:album|playlist)/', link))
+
+
+class Job:
+    def __init__(self, job_id, chat_id, status_msg, label, factory):
+        self.id = job_id
+        self.chat_id = chat_id
+        self.status_msg = status_msg
+        self.label = label
+        self.factory = factory
+        self.position = 0
+
+class JobScheduler:
+    """
+    FIFO queue per chat, round-robin between chats and a global cap on
+    running jobs. A chat never has two jobs running at the same time.
+    """
+    def __init__(self, max_running):
+        self.max_running = max_running
+        self.queues = {}
+        self.rr = deque()
+        self.running = {}
+        self.next_id = 1
+
+    def queued_count(self, chat_id):
+        return len(self.queues.get(chat_id, ()))
+
+    def submit(self, chat_id, status_msg, label, factory):
+        job = Job(self.next_id, chat_id, status_msg, label, factory)
+        self.next_id += 1
+        self.queues.setdefault(chat_id, deque()).append(job)
+        if chat_id not in self.rr: self.rr.append(chat_id)
+        self.dispatch()
+        return job
+
+    def cancel(self, job_id):
+        for chat_id, queue in self.queues.items():
+            for job in queue:
+                if job.id == job_id:
+                    queue.remove(job)
+                    if not queue: self._drop_chat(chat_id)
+                    self.refresh_positions()
+                    return job
+        return None
+
+    def _drop_chat(self, chat_id):
+        del self.queues[chat_id]
+        if chat_id in self.rr: self.rr.remove(chat_id)
+
+    def _next_job(self):
+        for _ in range(len(self.rr)):
+            chat_id = self.rr[0]
+            self.rr.rotate(-1)
+            if chat_id in self.running: continue
+            queue = self.queues[chat_id]
+            job = queue.popleft()
+            if not queue: self._drop_chat(chat_id)
+            return job
+        return None
+
+    def dispatch(self):
+        while len(self.running) < self.max_running:
+            job = self._next_job()
+            if not job: break
+            self.running[job.chat_id] = job
+            spawn(self._run(job))
+        self.refresh_positions()
+
+    async def _run(self, job):
+        user_states[job.chat_id] = {'running': True, 'start_time': time.time(), 'job_id': job.id}
+        try:
+            if job.position: await safe_edit(job.status_msg, f"🔍 <b>Checking {job.label} link...</b>", job.chat_id)
+            with metrics.timer('job'): await job.factory()
+            metrics.inc('jobs', result='done')
+        except Exception as e:
+            metrics.inc('jobs', result='failed')
+            logger.error(f"Job {job.id} failed: {e}")
+        finally:
+            user_states.pop(job.chat_id, None)
+            self.running.pop(job.chat_id, None)
+            self.dispatch()
+
+    def waiting_order(self):
+        """Waiting jobs in the order the round-robin will start them."""
+        lanes = [list(self.queues[c]) for c in self.rr]
+        order = []
+        while any(lanes):
+            for lane in lanes:
+                if lane: order.append(lane.pop(0))
+        return order
+
+    def refresh_positions(self):
+        for pos, job in enumerate(self.waiting_order(), 1):
+            if job.position == pos: continue
+            job.position = pos
+            status_renderer.set(job.status_msg, job.chat_id, f"⏳ <b>Queued ({job.label})</b>\n\n📍 Position: <b>{pos}</b>", cancel_data=f'cancel_q_{job.id}')
+
+def spawn(coro):
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+scheduler = JobScheduler(WORKER_COUNT * WORKER_JOBS if WORKER_COUNT else MAX_CONCURRENT_JOBS)
+# A batch job fans out into several tracks, so the cap on concurrent downloads is counted per track.
+track_slots = asyncio.Semaphore(MAX_CONCURRENT_JOBS)
+
+def holds_track_slot(fn):
+    """Runs every call inside one of the process-wide track_slots."""
+    @functools.wraps(fn)
+    async def inner(*args, **kwargs):
+        async with track_slots: return await fn(*args, **kwargs)
+    return inner
+
+class JobQueue:
+    """
+    Durable hand-off between the Telegram front end and the worker processes
+    (HAVEIT_WORKERS > 0), kept in the shared SQLite database. The front end
+    enqueues jobs and mirrors their progress into the status message; workers
+    claim them, write progress, heartbeats and results back, and stop a job
+    when its cancel flag is set. Running jobs whose worker stopped
+    heartbeating are claimed again.
+    """
+    def __init__(self):
+        self.ready = False
+
+    def load(self):
+        db = get_db()
+        with db_lock, db:
+            db.execute("CREATE TABLE IF NOT EXISTS jobs (id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, chat_id INTEGER, "
+                       "payload TEXT NOT NULL, state TEXT NOT NULL DEFAULT 'queued', progress TEXT, result TEXT, "
+                       "cancel INTEGER NOT NULL DEFAULT 0, worker TEXT, created_at REAL, heartbeat REAL)")
+            db.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, id)")
+        self.ready = True
+
+    def execute(self, sql, params=()):
+        if not self.ready: self.load()
+        db = get_db()
+        with db_lock, db: return db.execute(sql, params).fetchall()
+
+    def enqueue(self, kind, chat_id, payload):
+        if not self.ready: self.load()
+        db = get_db()
+        with db_lock, db:
+            return db.execute("INSERT INTO jobs (kind, chat_id, payload, created_at) VALUES (?, ?, ?, ?)",
+                              (kind, chat_id, json.dumps(payload, ensure_ascii=False), time.time())).lastrowid
+
+    def claim(self, worker):
+        """
+        Takes the oldest runnable job in one write transaction: (id, kind, chat_id, payload) or None.
+        A chat with a live running job is skipped, so one chat's jobs never run in parallel across workers.
+        """
+        if not self.ready: self.load()
+        now = time.time()
+        db = get_db()
+        with db_lock, db:
+            db.execute("BEGIN IMMEDIATE")
+            row = db.execute("SELECT id, kind, chat_id, payload FROM jobs WHERE cancel = 0 AND "
+                             "(state = 'queued' OR (state = 'running' AND heartbeat < ?)) AND chat_id NOT IN "
+                             "(SELECT chat_id FROM jobs WHERE state = 'running' AND heartbeat >= ?) ORDER BY id LIMIT 1",
+                             (now - JOB_STALE_AFTER, now - JOB_STALE_AFTER)).fetchone()
+            if not row: return None
+            claimed = db.execute("UPDATE jobs SET state = 'running', worker = ?, heartbeat = ? WHERE id = ? AND cancel = 0 AND state IN ('queued', 'running')",
+                                 (worker, now, row[0])).rowcount
+        return (*row[:3], json.loads(row[3])) if claimed == 1 else None
+
+    def progress(self, job_id, view):
+        self.execute("UPDATE jobs SET progress = ?, heartbeat = ? WHERE id = ?", (json.dumps(view, ensure_ascii=False), time.time(), job_id))
+
+    def heartbeat(self, job_ids):
+        if job_ids: self.execute(f"UPDATE jobs SET heartbeat = ? WHERE id IN ({','.join('?' * len(job_ids))})", (time.time(), *job_ids))
+
+    def cancelled(self, job_ids):
+        if not job_ids: return set()
+        return {r[0] for r in self.execute(f"SELECT id FROM jobs WHERE cancel = 1 AND id IN ({','.join('?' * len(job_ids))})", tuple(job_ids))}
+
+    def finish(self, job_id, state, result=None):
+        """Records the outcome; state 'queued' hands the job back for another worker."""
+        self.execute("UPDATE jobs SET state = ?, result = ? WHERE id = ?", (state, json.dumps(result), job_id))
+
+    def cancel(self, job_id):
+        self.execute("UPDATE jobs SET cancel = 1, state = CASE state WHEN 'queued' THEN 'cancelled' ELSE state END WHERE id = ?", (job_id,))
+
+    def get(self, job_id):
+        rows = self.execute("SELECT state, progress, result FROM jobs WHERE id = ?", (job_id,))
+        if not rows: return None
+        state, progress, result = rows[0]
+        return {'state': state, 'progress': json.loads(progress) if progress else None, 'result': json.loads(result) if result else None}
+
+    def unfinished(self):
+        """(id, chat_id, payload) of every queued or running job, oldest first."""
+        return [(i, c, json.loads(p)) for i, c, p in self.execute("SELECT id, chat_id, payload FROM jobs WHERE state IN ('queued', 'running') ORDER BY id")]
+
+    def trim(self):
+        self.execute("DELETE FROM jobs WHERE state NOT IN ('queued', 'running') AND created_at < ?", (time.time() - JOB_KEEP,))
+
+job_queue = JobQueue()
+
+async def run_job(kind, chat_id, status_msg, context, origin_msg, **payload):
+    """
+    Runs a scheduled job: in this process, or, with HAVEIT_WORKERS set, on a
+    worker process through job_queue while this process mirrors its progress.
+    kind is 'media' (url, platform) or 'batch' (links).
+    """
+    if not WORKER_COUNT:
+        if kind == 'batch': return await process_batch(payload['links'], chat_id, status_msg, context, origin_msg)
+        return await process_media(payload['url'], payload['platform'], chat_id, status_msg, context, origin_msg)
+    user_id = origin_msg.from_user.id if origin_msg.from_user else None
+    payload.update(status=status_msg.to_dict(), origin=origin_msg.to_dict(), channel=get_user_channel(user_id) if user_id else None)
 
+    def submit():
+        user_store.flush()  # the worker reloads this user's send history from the database
+        return job_queue.enqueue(kind, chat_id, payload)
 
+    job_id = await asyncio.get_running_loop().run_in_executor(db_executor, submit)
+    await watch_job(job_id, chat_id, status_msg)
+
+async def watch_job(job_id, chat_id, status_msg):
+    """
+    Mirrors a queued job's progress into its status message and forwards
+    cancels, until a worker finishes it. Raises if the worker's run failed.
+    """
+    loop = asyncio.get_running_loop()
+    seen, cancelled, job = None, False, None
+    while True:
+        await asyncio.sleep(JOB_POLL_INTERVAL)
+        if not cancelled and not user_states.get(chat_id, {}).get('running', True):
+            cancelled = True
+            await loop.run_in_executor(db_executor, job_queue.cancel, job_id)
+        job = await loop.run_in_executor(db_executor, job_queue.get, job_id)
+        if not job: break
+        if job['progress'] and job['progress'] != seen:
+            seen = job['progress']
+            status_renderer.set(status_msg, chat_id, seen[0], remove_keyboard=seen[1], cancel_data=seen[2])
+        if job['state'] not in ('queued', 'running'): break
+    if not (seen and seen[1]): status_renderer.drop(status_msg)
+    if job and job['state'] == 'failed': raise Exception(f"worker job {job_id} failed")
+
+
+@functools.lru_cache(maxsize=8192)
 def clean_text_for_search(text):
     """
     V6 Cleaner: Handles Nightcore brackets, years, genres, and splits features.
@@ -532,45 +1815,242 @@ def check_similarity(input_str, result_str):
     ratio = fuzz.token_set_ratio(input_str.lower(), result_str.lower())
     return ratio >= 60
 
-def search_genius_direct(query):
-    """ Source 2: Genius Search """
+def parse_genius_lyrics(content):
+    soup = BeautifulSoup(content, 'html.parser')
+    lyrics_divs = soup.find_all('div', {'data-lyrics-container': 'true'})
+    if lyrics_divs:
+        return "\n".join([div.get_text(separator="\n") for div in lyrics_divs])
+    return None
+
+async def search_genius_direct(query, expected_title=None):
+    """ Source 2: Genius Search. Returns (None, LOOKUP_ERROR) when Genius could not be reached. """
     try:
-        url = "https://genius.com/api/search/multi"
+        url = f"{GENIUS_URL}/api/search/multi"
         params = {'q': query, 'per_page': '1'}
-        headers = {'User-Agent': 'Mozilla/5.0'}
         
-        resp = requests.get(url, params=params, headers=headers, timeout=5)
+        resp = await http_pool.get(url, params=params)
+        if resp.status_code == 429 or resp.status_code >= 500: return None, LOOKUP_ERROR
         if resp.status_code == 200:
             data = resp.json()
             for section in data.get('response', {}).get('sections', []):
                 if section.get('type') in ['top_results', 'song'] and section.get('hits'):
                     hit = section['hits'][0]['result']
-                    page_url = f"https://genius.com{hit['path']}"
-                    page_resp = requests.get(page_url, headers=headers, timeout=5)
+                    if expected_title and hit.get('title') and not check_similarity(expected_title, hit['title']):
+                        return None, None
+                    page_url = f"{GENIUS_URL}{hit['path']}"
+                    page_resp = await http_pool.get(page_url)
+                    if page_resp.status_code == 429 or page_resp.status_code >= 500: return None, LOOKUP_ERROR
                     if page_resp.status_code == 200:
-                        soup = BeautifulSoup(page_resp.content, 'html.parser')
-                        lyrics_divs = soup.find_all('div', {'data-lyrics-container': 'true'})
-                        if lyrics_divs:
-                            return "\n".join([div.get_text(separator="\n") for div in lyrics_divs]), "Genius.com"
-    except: pass
+                        lyrics = await asyncio.get_running_loop().run_in_executor(None, parse_genius_lyrics, page_resp.content)
+                        if lyrics: return lyrics, "Genius.com"
+    except Exception as e:
+        logger.warning(f"Genius lookup failed for {query!r}: {e}")
+        return None, LOOKUP_ERROR
     return None, None
 
+async def wait_for_flight(unique_key, chat_id, set_status):
+    """
+    Single-flight per track: the first job for a key does the work and later
+    jobs wait for it, then read the result from the cache channel.
+    Returns True when the caller became the leader for the key.
+    """
+    notified = False
+    while unique_key in inflight:
+        if not notified:
+            await set_status("🔗 <b>Same track is already being prepared, waiting...</b>")
+            notified = True
+        try: await asyncio.wait_for(asyncio.shield(inflight[unique_key]), 1)
+        except asyncio.TimeoutError: pass
+        if not user_states.get(chat_id, {}).get('running'): raise Exception("Cancelled")
+        if unique_key not in inflight and get_from_cache(unique_key): return False
+    inflight[unique_key] = asyncio.get_running_loop().create_future()
+    return True
+
+def finish_flight(unique_key):
+    flight = inflight.pop(unique_key, None)
+    if flight and not flight.done(): flight.set_result(True)
+
+class BatchProgress:
+    """
+    Aggregate status view of a batch job: overall progress plus one line per
+    active track. Writers only touch state; status_renderer calls render().
+    """
+    def __init__(self, status_msg, chat_id, labels):
+        self.status_msg = status_msg
+        self.chat_id = chat_id
+        self.labels = labels
+        self.lines = {}
+        self.done = set()
+        self.failed = set()
+        self.results = {}
+
+    def update(self, track_no, text):
+        if text.startswith(("❌", "⛔️")):
+            self.failed.add(track_no)
+            self.lines.pop(track_no, None)
+        else:
+            self.lines[track_no] = re.sub(r'<[^>]+>', '', text).split('\n')[0].strip()
+
+    def progress(self, track_no, d):
+        if d.get('status') != 'downloading': return
+        total = d.get('total_bytes') or d.get('total_bytes_estimate') or 0
+        p = int(d.get('downloaded_bytes', 0) / total * 100) if total else 0
+        self.update(track_no, f"⬇️ Downloading {p}%")
+
+    def finish(self, track_no, result):
+        self.lines.pop(track_no, None)
+        if result:
+            self.results[track_no] = result
+            self.done.add(track_no)
+            self.failed.discard(track_no)
+        else:
+            self.failed.add(track_no)
+
+    def render(self):
+        total = len(self.labels)
+        p = (len(self.done) + len(self.failed)) / total * 100 if total else 100
+        text = f"📦 <b>Batch: {len(self.done)}/{total} ready</b>"
+        if self.failed: text += f" • ❌ {len(self.failed)} failed"
+        text += f"\n\n{make_progress_bar(p)} <b>{int(p)}%</b>\n"
+        for no in sorted(list(self.lines))[:BATCH_CONCURRENCY]:
+            line = self.lines.get(no)
+            if line: text += f"\n▶️ <b>#{no + 1}</b> {html.escape(self.labels[no][:40])}\n      └ {html.escape(line)}"
+        return text
+
+def expand_playlist(link):
+    """Flat-extracts a YouTube playlist or SoundCloud set into [(url, title)]."""
+    opts = {'extract_flat': 'in_playlist', 'proxy': PROXY_URL, 'quiet': True, 'cachedir': YTDL_CACHE_DIR,
+            'playlistend': BATCH_MAX_TRACKS, 'http_headers': {'User-Agent': 'Mozilla/5.0'}}
+    with ydl_pool.acquire(opts) as ydl: res = ydl.extract_info(link, download=False)
+    tracks = []
+    for entry in (res or {}).get('entries') or []:
+        if not entry: continue
+        url = entry.get('url') or entry.get('webpage_url')
+        if url: tracks.append((url, entry.get('title') or url))
+    return tracks
+
+async def expand_spotify_collection(link):
+    """Track URLs of a Spotify album or playlist page, in page order."""
+    resp = await http_pool.get(link)
+    if resp.status_code != 200: return []
+    ids = re.findall(r'<meta[^>]+name="music:song"[^>]+content="https://open\.spotify\.com/track/([A-Za-z0-9]{22})', resp.text)
+    if not ids: ids = re.findall(r'open\.spotify\.com/track/([A-Za-z0-9]{22})', resp.text)
+    return [f"https://open.spotify.com/track/{tid}" for tid in dict.fromkeys(ids)]
+
+async def expand_links(links):
+    """Turns playlist, album and multi-link messages into a flat [(url, platform, label)] list."""
+    loop = asyncio.get_running_loop()
+    tracks = []
+    for link in links:
+        platform = detect_platform(link)
+        try:
+            if platform == "Spotify" and is_collection_link(link):
+                urls = await expand_spotify_collection(link)
+                metas = await spotify_resolver.resolve_many(urls)
+                tracks += [(u, platform, f"{a} - {s}" if s else u) for u, (s, a) in zip(urls, metas)]
+            elif is_collection_link(link):
+                entries = await loop.run_in_executor(media_executor, expand_playlist, link)
+                tracks += [(u, platform, t) for u, t in entries]
+            else:
+                tracks.append((link, platform, link))
+        except Exception as e:
+            logger.error(f"Batch expand failed for {link}: {e}")
+    return tracks[:BATCH_MAX_TRACKS]
+
+async def process_batch(links, chat_id, status_msg, context, origin_msg):
+    """
+    Runs every track of a batch through process_media with up to
+    BATCH_CONCURRENCY tracks in flight, so resolving, downloading, encoding
+    and uploading overlap. Cached tracks come straight from the cache channel.
+    """
+    await safe_edit(status_msg, "📦 <b>Expanding links...</b>", chat_id)
+    tracks = await expand_links(links)
+    if not tracks:
+        await safe_edit(status_msg, "❌ <b>No tracks found.</b>", chat_id, remove_keyboard=True)
+        return
+
+    batch = BatchProgress(status_msg, chat_id, [label for _, _, label in tracks])
+    status_renderer.set(status_msg, chat_id, batch.render)
+    slots = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def run(track_no, url, platform):
+        async with slots:
+            if not user_states.get(chat_id, {}).get('running'):
+                batch.finish(track_no, None)
+                return
+            batch.update(track_no, "🔍 Starting...")
+            result = await process_media(url, platform, chat_id, status_msg, context, origin_msg, batch=batch, track_no=track_no)
+            batch.finish(track_no, result)
+
+    await asyncio.gather(*(run(i, url, platform) for i, (url, platform, _) in enumerate(tracks)))
+
+    if not user_states.get(chat_id, {}).get('running'):
+        await safe_edit(status_msg, f"⛔️ <b>Batch cancelled.</b> {len(batch.done)}/{len(tracks)} delivered.", chat_id, remove_keyboard=True)
+        return
+
+    status_renderer.drop(status_msg)
+    try: await status_msg.delete()
+    except: pass
+
+    items = [batch.results[no] for no in sorted(batch.results)]
+    text = f"📦 <b>Batch finished:</b> {len(items)}/{len(tracks)} tracks ready."
+    kb_buttons = []
+    if items and origin_msg.chat.type == ChatType.PRIVATE and get_user_channel(origin_msg.from_user.id):
+        batch_id = user_states[chat_id]['job_id']
+        batch_results[batch_id] = items
+        while len(batch_results) > BATCH_RESULTS_KEEP: batch_results.pop(next(iter(batch_results)))
+        kb_buttons.append([InlineKeyboardButton("✅ Send All to Channel", callback_data=f'send_batch_{batch_id}')])
+    await context.bot.send_message(chat_id, text, parse_mode=ParseMode.HTML, reply_markup=InlineKeyboardMarkup(kb_buttons) if kb_buttons else None)
+
+@timed('upload')
+async def upload_audio(bot, chat_id, path, thumb_path=None, filename=None, **kwargs):
+    """
+    Sends a finished MP3 by path. python-telegram-bot uploads it as multipart
+    to the cloud API; with TELEGRAM_LOCAL_MODE only a file:// URI is sent and
+    the local Bot API server reads the file from disk.
+
+    Media-cache files are named by hash, so `filename` sets the name users
+    see: the multipart filename in cloud mode, a hard link in local mode.
+    """
+    if filename:
+        stem, ext = os.path.splitext(filename)
+        stem = re.sub(r'[\\/:*?"<>|\x00-\x1f]+', '_', stem).strip()[:120]
+        filename = stem + ext if stem else None
+    link_dir = None
+    if TELEGRAM_LOCAL_MODE and filename and os.path.basename(path) != filename:
+        os.makedirs(UPLOAD_DIR, exist_ok=True)
+        link_dir = tempfile.mkdtemp(dir=UPLOAD_DIR)
+        named = os.path.join(link_dir, filename)
+        try: os.link(path, named)
+        except OSError: shutil.copyfile(path, named)
+        path = named
+    try:
+        return await bot.send_audio(chat_id, Path(path), thumbnail=Path(thumb_path) if thumb_path else None, filename=filename, **kwargs)
+    finally:
+        if link_dir: shutil.rmtree(link_dir, ignore_errors=True)
+
 def cleanup_files(file_mp3, thumb_path, stem):
     try:
-        if file_mp3 and os.path.exists(file_mp3): os.remove(file_mp3)
-        if thumb_path and os.path.exists(thumb_path): os.remove(thumb_path)
+        if file_mp3 and os.path.exists(file_mp3) and not media_cache.owns(file_mp3): os.remove(file_mp3)
+        if thumb_path and os.path.exists(thumb_path) and not media_cache.owns(thumb_path): os.remove(thumb_path)
         if stem:
-            for f in glob.glob(f"{glob.escape(stem)}*"):
+            for f in glob.glob(f"{glob.escape(stem)}.*"):
                 try: os.remove(f)
                 except: pass
     except Exception as e:
         print(f"Cleanup Error: {e}")
 
-async def process_media(url, platform, chat_id, status_msg, context, origin_msg):
+@holds_track_slot
+async def process_media(url, platform, chat_id, status_msg, context, origin_msg, batch=None, track_no=0):
+    """
+    Delivers one track. Inside a batch, status goes to the batch's aggregate
+    view and the per-track menu is skipped. Returns (audio_id, photo_id, unique_key) or None.
+    """
     loop = asyncio.get_running_loop()
     display_source_name = "Unknown" 
     file_name_mp3 = None
     thumbnail_path = None
+    thumb_path = None
     filename_stem = None
     unique_key = None
     info_dict = None 
@@ -580,154 +2060,157 @@ async def process_media(url, platform, chat_id, status_msg, context, origin_msg)
 
     cache_audio_id = None
     cache_photo_id = None
+    cached_data = None
     
     freshly_downloaded_photo = False
     freshly_downloaded_audio = False
+    leads_flight = False
+    photo_caption = None
+    audio_meta = {}
+    aliases = []
+
+    async def set_status(text, remove_keyboard=False):
+        if batch: batch.update(track_no, text)
+        else: await safe_edit(status_msg, text, chat_id, remove_keyboard=remove_keyboard)
 
     try:
         download_target = url
+        aliases = url_aliases(url)
         
         if platform == "Spotify":
-            await safe_edit(status_msg, "🟢 <b>Processing...</b>", chat_id)
-            song, artist = await loop.run_in_executor(None, get_spotify_metadata, url)
+            await set_status("🟢 <b>Processing...</b>")
+            song, artist = await get_spotify_metadata(url)
             if song:
                 display_source_name = artist 
-                clean_a = clean_text_for_search(artist)
-                clean_t = clean_text_for_search(song)
-                unique_key = f"{clean_a}_{clean_t}"
+                spotify_key = make_track_key(artist, song)
+                aliases.append(f"key:{spotify_key}")
+                await sync_shared_stores(aliases, spotify_key)
+                unique_key = track_index.resolve(aliases)
+                known_video = track_index.alias_of(unique_key, "yt") if unique_key else None
                 
-                await safe_edit(status_msg, f"🔎 <b>Search:</b>\n🎶 {artist} - {song}", chat_id)
-                temp_opts = {
-                    'proxy': PROXY_URL, 
-                    'quiet': True, 
-                    'extractor_args': {'youtube': {'player_client': ['android', 'web']}}
-                }
-                best = await loop.run_in_executor(None, smart_find_best_match, song, artist, temp_opts)
-                download_target = best if best else f"ytsearch1:{artist} - {song} Audio"
+                if known_video and (get_from_cache(unique_key) or media_cache.lookup([unique_key], 'audio', count=False)):
+                    download_target = f"https://www.youtube.com/watch?v={known_video}"
+                else:
+                    await set_status(f"🔎 <b>Search:</b>\n🎶 {artist} - {song}")
+                    temp_opts = {
+                        'proxy': PROXY_URL, 
+                        'quiet': True, 
+                        'cachedir': YTDL_CACHE_DIR,
+                        'extractor_args': {'youtube': {'player_client': ['android', 'web']}}
+                    }
+                    best = await loop.run_in_executor(media_executor, smart_find_best_match, song, artist, temp_opts)
+                    download_target = best if best else f"ytsearch1:{artist} - {song} Audio"
+                    if best: aliases += url_aliases(best)
+                    await sync_shared_stores(aliases, spotify_key)
+                    unique_key = track_index.resolve(aliases) or spotify_key
             else: 
                 raise Exception("Invalid Spotify Link")
+        else:
+            await sync_shared_stores(aliases)
+            unique_key = track_index.resolve(aliases)
+
+        ydl_opts_base = {
+            'format': 'bestaudio/best', 'proxy': PROXY_URL, 'noplaylist': True,
+            'nocheckcertificate': True, 'outtmpl': {'default': '%(title)s [%(id)s].%(ext)s'},
+            'source_address': '0.0.0.0', 'cachedir': YTDL_CACHE_DIR,
+            'extractor_args': {'youtube': {'player_client': ['android', 'web']}},
+            'http_headers': {'User-Agent': 'Mozilla/5.0'}
+        }
+
+        if not unique_key:
+            for attempt in range(1, 4):
+                route_gen = route_manager.generation
+                try:
+                    await route_manager.wait_healthy()
+                    info_dict = await loop.run_in_executor(media_executor, resolve_track, download_target, ydl_opts_base)
+                    break
+                except Exception as e:
+                    if attempt == 3: raise
+                    metrics.inc('retries', stage='resolve')
+                    await route_manager.rotate(route_gen)
+            aliases += info_aliases(info_dict)
+            await sync_shared_stores(aliases, track_key_from_info(info_dict))
+            unique_key = track_index.resolve(aliases) or track_key_from_info(info_dict)
 
         if unique_key and CACHE_CHANNEL_ID:
+            leads_flight = await wait_for_flight(unique_key, chat_id, set_status)
+            await sync_shared_stores(aliases, unique_key)
             cached_data = get_from_cache(unique_key)
+            metrics.inc('channel_cache', result='hit' if cached_data else 'miss')
             if cached_data:
                 cache_audio_id = cached_data.get('audio')
                 cache_photo_id = cached_data.get('photo')
 
-        if cache_photo_id:
-            try:
-                final_photo_msg = await context.bot.copy_message(chat_id, CACHE_CHANNEL_ID, cache_photo_id)
-            except:
-                final_photo_msg = None
+        if cached_data and (cache_photo_id or cached_data.get('photo_file_id')):
+            final_photo_msg = await send_cached_media(context.bot, chat_id, unique_key, cached_data, 'photo')
+
+        cache_keys = media_cache_keys(unique_key, aliases)
 
         if not final_photo_msg:
-            await safe_edit(status_msg, "🖼 <b>Fetching Cover...</b>", chat_id)
-            
+            await set_status("🖼 <b>Fetching Cover...</b>")
+            cover_meta = {}
+            cached_thumb = media_cache.lookup(cache_keys, 'thumb')
+            cached_cover = media_cache.lookup(cache_keys, 'cover', count=False) if cached_thumb else None
+            if cached_cover:
+                (thumbnail_path, cover_meta), (thumb_path, _) = cached_cover, cached_thumb
+                freshly_downloaded_photo = True
+
             for attempt in range(1, 4):
+                if thumbnail_path: break
                 try:
-                    ydl_opts_photo = {
-                        'format': 'bestaudio/best', 
-                        'proxy': PROXY_URL, 
-                        'noplaylist': True, 
-                        'writethumbnail': True, 
-                        'skip_download': True,
-                        'nocheckcertificate': True, 
-                        'outtmpl': {'default': '%(title)s.%(ext)s'},
-                        'source_address': '0.0.0.0', 
-                        'cachedir': False,
-                        'extractor_args': {'youtube': {'player_client': ['android']}},
-                        'http_headers': {'User-Agent': 'Mozilla/5.0'}
-                    }
-                    
-                    if not unique_key:
-                        info_temp = await loop.run_in_executor(None, lambda: yt_dlp.YoutubeDL(ydl_opts_photo).extract_info(download_target, download=False))
-                        if 'entries' in info_temp: info_temp = info_temp['entries'][0]
-                        
-                        raw_a = clean_text_for_search(info_temp.get('uploader', ''))
-                        raw_t = clean_text_for_search(info_temp.get('title', ''))
-                        if " - " in info_temp.get('title', ''):
-                            parts = info_temp['title'].split(" - ", 1)
-                            raw_a = clean_text_for_search(parts[0])
-                            raw_t = clean_text_for_search(parts[1])
-                        
-                        unique_key = f"{raw_a}_{raw_t}"
-
-                        if CACHE_CHANNEL_ID:
-                            c_new = get_from_cache(unique_key)
-                            if c_new:
-                                cache_audio_id = c_new.get('audio')
-                                if c_new.get('photo') and not final_photo_msg:
-                                    try:
-                                        final_photo_msg = await context.bot.copy_message(chat_id, CACHE_CHANNEL_ID, c_new['photo'])
-                                        cache_photo_id = c_new.get('photo')
-                                        break
-                                    except: pass
-
-                    dl_info = await loop.run_in_executor(None, lambda: yt_dlp.YoutubeDL(ydl_opts_photo).extract_info(download_target, download=True))
-                    if 'entries' in dl_info: dl_info = dl_info['entries'][0]
-                    info_dict = dl_info
-                    
-                    full_filename = yt_dlp.YoutubeDL(ydl_opts_photo).prepare_filename(dl_info)
-                    filename_stem = os.path.splitext(full_filename)[0]
-                    
-                    for ext in ['.webp', '.jpg', '.png']:
-                        if os.path.exists(filename_stem + ext): 
-                            thumbnail_path = filename_stem + ext
-                            break
-                    
+                    if not info_dict:
+                        info_dict = await loop.run_in_executor(media_executor, resolve_track, download_target, ydl_opts_base)
+                    cover = await loop.run_in_executor(media_executor, fetch_cover, info_dict, ydl_opts_base,
+                                                       media_cache_keys(unique_key, aliases + info_aliases(info_dict)))
                     freshly_downloaded_photo = True
+                    if cover: thumbnail_path, thumb_path, cover_meta = cover
                     break
                 except Exception as e:
+                    metrics.inc('retries', stage='thumbnail')
                     await asyncio.sleep(1)
 
             if not final_photo_msg and thumbnail_path and os.path.exists(thumbnail_path):
-                t_title = info_dict.get('title', 'Music') if info_dict else "Music"
-                with open(thumbnail_path, 'rb') as f:
-                    final_photo_msg = await context.bot.send_photo(chat_id, f, caption=f"🖼 <b>{html.escape(t_title)}</b>", parse_mode=ParseMode.HTML)
+                t_title = cover_meta.get('title') or "Music"
+                photo_caption = f"🖼 <b>{html.escape(t_title)}</b>"
+                with metrics.timer('upload'):
+                    final_photo_msg = await context.bot.send_photo(chat_id, Path(thumbnail_path), caption=photo_caption, parse_mode=ParseMode.HTML)
 
-        if cache_audio_id and not final_audio_msg:
-            try:
-                final_audio_msg = await context.bot.copy_message(chat_id, CACHE_CHANNEL_ID, cache_audio_id)
-            except:
-                final_audio_msg = None
+        if cached_data and (cache_audio_id or cached_data.get('audio_file_id')) and not final_audio_msg:
+            final_audio_msg = await send_cached_media(context.bot, chat_id, unique_key, cached_data, 'audio')
 
+        track_meta = None
         if not final_audio_msg:
+            cached_mp3 = media_cache.lookup(cache_keys, 'audio')
+            if cached_mp3:
+                file_name_mp3, track_meta = cached_mp3
+                freshly_downloaded_audio = True
+
+        if not final_audio_msg and not file_name_mp3:
             for attempt in range(1, 4):
+                route_gen = route_manager.generation
                 try:
                     if not user_states.get(chat_id, {}).get('running'): raise Exception("Cancelled")
+                    await route_manager.wait_healthy()
                     
-                    await safe_edit(status_msg, "⬇️ <b>Downloading Audio...</b>", chat_id)
+                    await set_status("⬇️ <b>Downloading Audio...</b>")
+
+                    if not info_dict:
+                        info_dict = await loop.run_in_executor(media_executor, resolve_track, download_target, ydl_opts_base)
                     
-                    ydl_opts_audio = {
-                        'format': 'bestaudio/best', 'proxy': PROXY_URL, 'noplaylist': True, 
-                        'writethumbnail': False,
-                        'nocheckcertificate': True, 'outtmpl': {'default': '%(title)s.%(ext)s'},
-                        'source_address': '0.0.0.0', 'cachedir': False,
-                        'extractor_args': {'youtube': {'player_client': ['android', 'web']}},
-                        'postprocessors': [{'key': 'FFmpegExtractAudio','preferredcodec': 'mp3','preferredquality': '320'}],
-                        'http_headers': {'User-Agent': 'Mozilla/5.0'}
-                    }
+                    if (info_dict.get('duration') or 0) > MAX_DURATION_SECONDS:
+                        await set_status(f"❌ Too long.", remove_keyboard=True)
+                        return
+
+                    ydl_opts_audio = dict(ydl_opts_base, writethumbnail=False,
+                                          postprocessors=[{'key': 'FFmpegExtractAudio','preferredcodec': 'mp3','preferredquality': '320'}])
 
                     def hook(d):
                         if not user_states.get(chat_id, {}).get('running'): raise yt_dlp.utils.DownloadError("Cancelled")
-                        now = time.time()
-                        if chat_id in last_update_time:
-                            if now - last_update_time[chat_id] < 3.0 and d['status'] == 'downloading': return
-                        last_update_time[chat_id] = now
-                        asyncio.run_coroutine_threadsafe(update_status_message(d, status_msg, chat_id), loop)
-
-                    dl_info = await loop.run_in_executor(None, blocking_download, download_target, ydl_opts_audio, hook)
-                    if 'entries' in dl_info: dl_info = dl_info['entries'][0]
-                    info_dict = dl_info
-                    
-                    full_filename = yt_dlp.YoutubeDL(ydl_opts_audio).prepare_filename(dl_info)
-                    filename_stem = os.path.splitext(full_filename)[0]
-                    file_name_mp3 = filename_stem + '.mp3'
-                    
-                    if dl_info.get('duration', 0) > MAX_DURATION_SECONDS:
-                        await safe_edit(status_msg, f"❌ Too long.", chat_id, remove_keyboard=True)
-                        cleanup_files(file_name_mp3, thumbnail_path, filename_stem)
-                        return
+                        if d.get('status') != 'downloading': return
+                        if batch: batch.progress(track_no, d)
+                        else: status_renderer.set(status_msg, chat_id, functools.partial(render_progress_text, dict(d), chat_id))
 
+                    file_name_mp3, filename_stem = await loop.run_in_executor(media_executor, download_audio, info_dict, ydl_opts_audio, hook)
                     freshly_downloaded_audio = True
                     break
                 except Exception as e:
@@ -735,12 +2218,18 @@ async def process_media(url, platform, chat_id, status_msg, context, origin_msg)
                         cleanup_files(file_name_mp3, thumbnail_path, filename_stem)
                         return
                     if attempt == 3: 
-                        await safe_edit(status_msg, f"❌ Error: {e}", chat_id, remove_keyboard=True)
+                        await set_status(f"❌ Error: {e}", remove_keyboard=True)
                         cleanup_files(file_name_mp3, thumbnail_path, filename_stem)
                         return
-                    await loop.run_in_executor(None, rotate_warp_ip)
-
-            if not final_audio_msg and file_name_mp3 and os.path.exists(file_name_mp3):
+                    metrics.inc('retries', stage='download')
+                    await route_manager.rotate(route_gen)
+                    # Format URLs may be bound to the old route, resolve again.
+                    info_dict = None
+
+        if not final_audio_msg and file_name_mp3 and os.path.exists(file_name_mp3):
+            if track_meta:
+                final_title, final_artist = track_meta['title'], track_meta['performer']
+            else:
                 final_title = info_dict.get('title', 'Unknown Track')
                 final_artist = display_source_name
                 if platform != "Spotify":
@@ -752,56 +2241,71 @@ async def process_media(url, platform, chat_id, status_msg, context, origin_msg)
                             final_artist = parts[0].strip()
                             final_title = parts[1].strip()
 
-                safe_title = html.escape(final_title)
-                safe_artist = html.escape(final_artist)
-                caption = (f"🎵 Name: <b>{safe_title}</b>\n👤 Artist/Source: <b>{safe_artist}</b>\n"
-                           f"📱 Platform: <b>{platform}</b>\n⚡️ Quality: 320kbps\n\n"
-                           f"✨ Downloaded by <b>@{context.bot.username}</b>\n🎈 By: <b>@sorblack</b>")
+            aliases.append(f"key:{make_track_key(final_artist, final_title)}")
+            safe_title = html.escape(final_title)
+            safe_artist = html.escape(final_artist)
+            caption = (f"🎵 Name: <b>{safe_title}</b>\n👤 Artist/Source: <b>{safe_artist}</b>\n"
+                       f"📱 Platform: <b>{platform}</b>\n⚡️ Quality: 320kbps\n\n"
+                       f"✨ Downloaded by <b>@{context.bot.username}</b>\n🎈 By: <b>@sorblack</b>")
 
-                await safe_edit(status_msg, "📤 <b>Uploading...</b>", chat_id)
-                
-                if thumbnail_path: 
-                    await loop.run_in_executor(None, embed_cover, file_name_mp3, thumbnail_path, info_dict, final_artist)
-                
-                with open(file_name_mp3, 'rb') as f:
-                    th = open(thumbnail_path, 'rb') if thumbnail_path else None
-                    final_audio_msg = await context.bot.send_audio(
-                        chat_id, f, thumbnail=th, 
-                        title=final_title, performer=final_artist, caption=caption, parse_mode=ParseMode.HTML
-                    )
-                    if th: th.close()
+            await set_status("📤 <b>Uploading...</b>")
+            
+            if not thumb_path and not track_meta:
+                cached_thumb = media_cache.lookup(cache_keys, 'thumb', count=False)
+                if cached_thumb: thumb_path = cached_thumb[0]
+            if thumb_path and not track_meta: 
+                await loop.run_in_executor(media_executor, embed_cover, file_name_mp3, thumb_path, info_dict, final_artist)
+            
+            if os.path.getsize(file_name_mp3) > MAX_UPLOAD_BYTES:
+                await set_status(f"❌ File is over the {MAX_UPLOAD_BYTES // 1024 ** 2} MB upload limit.", remove_keyboard=True)
+                return
+            final_audio_msg = await upload_audio(context.bot, chat_id, file_name_mp3, thumb_path, filename=f"{final_artist} - {final_title}.mp3",
+                                                 title=final_title, performer=final_artist, caption=caption, parse_mode=ParseMode.HTML)
+            audio_meta = {'title': final_title, 'performer': final_artist, 'caption': caption}
+            if not track_meta:
+                keys = media_cache_keys(unique_key, aliases + (info_aliases(info_dict) if info_dict else []))
+                file_name_mp3 = await loop.run_in_executor(media_executor, media_cache.store, file_name_mp3, 'audio', keys,
+                                                           {'title': final_title, 'performer': final_artist})
 
         if CACHE_CHANNEL_ID and unique_key:
 
             needs_repair = freshly_downloaded_photo or freshly_downloaded_audio
             
             if needs_repair:
-
-                if cache_audio_id: 
-                    try: await context.bot.delete_message(CACHE_CHANNEL_ID, cache_audio_id)
-                    except: pass
-                if cache_photo_id: 
-                    try: await context.bot.delete_message(CACHE_CHANNEL_ID, cache_photo_id)
-                    except: pass
-                
-                new_db_p = None
-                new_db_a = None
-                
-                if final_photo_msg:
-                    try:
-                        bk_p = await context.bot.copy_message(CACHE_CHANNEL_ID, chat_id, final_photo_msg.message_id)
-                        new_db_p = bk_p.message_id
-                    except: pass
-                
-                if final_audio_msg:
+                # Media whose file_unique_id is already cached (or that was served
+                # from the cache) keeps its channel message; only changed media is
+                # copied, and the old copy is deleted once the new one exists.
+                # Start from the current entry, not the job's snapshot, so IDs forgotten since are not written back.
+                entry = {k: v for k, v in (get_from_cache(unique_key) or {}).items() if k != 'timestamp'}
+                if photo_caption: entry['photo_caption'] = photo_caption
+                entry.update(audio_meta)
+
+                for kind, msg, old_id in (('photo', final_photo_msg, cache_photo_id), ('audio', final_audio_msg, cache_audio_id)):
+                    if not msg: continue
+                    file_id, file_unique_id = media_ids(msg, kind)
+                    if old_id and (not file_unique_id or file_unique_id == entry.get(f'{kind}_unique_id')):
+                        if file_id: entry[f'{kind}_file_id'] = file_id
+                        continue
                     try:
-                        bk_a = await context.bot.copy_message(CACHE_CHANNEL_ID, chat_id, final_audio_msg.message_id)
-                        new_db_a = bk_a.message_id
-                    except: pass
-                
-                if new_db_a:
-                    save_to_global_cache(unique_key, new_db_a, new_db_p)
+                        with metrics.timer('cache_backup'): bk = await context.bot.copy_message(CACHE_CHANNEL_ID, chat_id, msg.message_id)
+                    except: continue
+                    if old_id:
+                        try: await context.bot.delete_message(CACHE_CHANNEL_ID, old_id)
+                        except: pass
+                    entry.update({kind: bk.message_id, f'{kind}_file_id': file_id, f'{kind}_unique_id': file_unique_id})
+
+                if entry.get('audio'):
+                    save_to_global_cache(unique_key, entry.pop('audio'), entry.pop('photo', None), **entry)
+
+        if unique_key and final_audio_msg:
+            if info_dict: aliases += info_aliases(info_dict)
+            track_index.link(unique_key, aliases)
+
+        if batch:
+            if not final_audio_msg: return None
+            return final_audio_msg.message_id, final_photo_msg.message_id if final_photo_msg else 0, unique_key
 
+        status_renderer.drop(status_msg)
         try: await status_msg.delete()
         except: pass
         
@@ -809,7 +2313,11 @@ async def process_media(url, platform, chat_id, status_msg, context, origin_msg)
         if origin_msg.chat.type == ChatType.PRIVATE:
              ch = get_user_channel(origin_msg.from_user.id)
              if ch:
-                 if final_audio_msg:
+                 sent_id = get_history_message(origin_msg.from_user.id, unique_key) if unique_key else None
+                 if sent_id:
+                     link = get_message_link(ch['channel_id'], sent_id, ch.get('channel_username'))
+                     kb_buttons.append([InlineKeyboardButton("🔗 View in Channel", url=link)])
+                 elif final_audio_msg:
                      pid = final_photo_msg.message_id if final_photo_msg else 0
                      aid = final_audio_msg.message_id
                      kb_buttons.append([InlineKeyboardButton("✅ Send to Channel", callback_data=f'send_to_ch_{aid}_{pid}')])
@@ -831,31 +2339,507 @@ async def process_media(url, platform, chat_id, status_msg, context, origin_msg)
             )
 
         else:
-            await safe_edit(status_msg, "❌ <b>Download Failed.</b>", chat_id, remove_keyboard=True)
+            await set_status("❌ <b>Download Failed.</b>", remove_keyboard=True)
+            return None
+
+        return final_audio_msg.message_id, final_photo_msg.message_id if final_photo_msg else 0, unique_key
 
     except Exception as e:
         if "Cancelled" in str(e):
-            await safe_edit(status_msg, "⛔️ <b>Cancelled.</b>", chat_id, remove_keyboard=True)
+            await set_status("⛔️ <b>Cancelled.</b>", remove_keyboard=True)
         else:
-            await safe_edit(status_msg, f"❌ Error: {e}", chat_id, remove_keyboard=True)
+            await set_status(f"❌ Error: {e}", remove_keyboard=True)
             logger.error(e)
             
     finally:
+        if leads_flight: finish_flight(unique_key)
         cleanup_files(file_name_mp3, thumbnail_path, filename_stem)
-        if chat_id in active_chats: active_chats.remove(chat_id)
-        if chat_id in user_states: del user_states[chat_id]
 
 
-def blocking_download(url, opts, hook):
+class YDLPool:
+    """
+    Reusable YoutubeDL instances keyed by their option set. A kept instance
+    holds its extractors, so the YouTube player and signature functions stay
+    warm in memory; cachedir keeps them on disk across restarts.
+    """
+    def __init__(self, per_key):
+        self.per_key = per_key
+        self.idle = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(opts):
+        return json.dumps(opts, sort_keys=True, default=str)
+
+    @contextlib.contextmanager
+    def acquire(self, opts):
+        key = self.key(opts)
+        with self.lock:
+            idle = self.idle.get(key)
+            ydl = idle.pop() if idle else None
+        if ydl is None: ydl = yt_dlp.YoutubeDL(copy.deepcopy(opts))
+        try:
+            yield ydl
+        finally:
+            with self.lock:
+                idle = self.idle.setdefault(key, [])
+                if len(idle) < self.per_key:
+                    idle.append(ydl)
+                    ydl = None
+            if ydl: ydl.close()
+
+ydl_pool = YDLPool(YDL_POOL_SIZE)
+
+@timed('resolve')
+def resolve_track(target, opts):
+    """Extracts the info dict once; the thumbnail and audio stages reuse it."""
+    with ydl_pool.acquire(opts) as ydl: info = ydl.extract_info(target, download=False)
+    if 'entries' in info: info = info['entries'][0]
+    return info
+
+def make_track_key(artist, title):
+    """Normalized artist_title key, the same for every entry path."""
+    return f"{clean_text_for_search(artist or '')}_{clean_text_for_search(title or '')}"
+
+def track_key_from_info(info):
+    title = info.get('title') or ''
+    if " - " in title: return make_track_key(*title.split(" - ", 1))
+    return make_track_key(info.get('uploader'), title)
+
+def url_aliases(url):
+    """Identity aliases that can be read off a link without a network request."""
+    aliases = []
+    match = YOUTUBE_ID_RE.search(url or "")
+    if match: aliases.append(f"yt:{match.group(1)}")
+    track_id = spotify_track_id(url)
+    if track_id: aliases.append(f"sp:{track_id}")
+    match = SOUNDCLOUD_PATH_RE.search(url or "")
+    if match: aliases.append(f"scurl:{match.group(1).strip('/').lower()}")
+    return aliases
+
+def info_aliases(info):
+    ie = (info.get('extractor_key') or '').lower()
+    prefix = {'youtube': 'yt', 'soundcloud': 'sc'}.get(ie, ie)
+    aliases = [f"{prefix}:{info['id']}"] if prefix and info.get('id') else []
+    return aliases + [f"key:{track_key_from_info(info)}"]
+
+class TrackIndex:
+    """
+    Canonical identity of a recording. YouTube, SoundCloud and Spotify IDs,
+    link paths and normalized artist_title keys are aliases of one canonical
+    key, which is what the global cache and single-flight are keyed on.
+    """
+    def __init__(self):
+        self.aliases = {}
+        self.by_canonical = {}
+        self.pending = []
+        self.lock = threading.Lock()
+        self.ready = False
+
+    def load(self):
+        db = get_db()
+        with db_lock, db:
+            db.execute("CREATE TABLE IF NOT EXISTS track_aliases (alias TEXT PRIMARY KEY, canonical TEXT NOT NULL)")
+            rows = db.execute("SELECT alias, canonical FROM track_aliases").fetchall()
+        for alias, canonical in rows: self._add(alias, canonical)
+        self.ready = True
+
+    def _add(self, alias, canonical):
+        self.aliases[alias] = canonical
+        self.by_canonical.setdefault(canonical, set()).add(alias)
+
+    def resolve(self, aliases):
+        if not self.ready: self.load()
+        for alias in aliases:
+            if alias in self.aliases: return self.aliases[alias]
+        return None
+
+    def reload(self, aliases):
+        """Picks up aliases other worker processes linked since load(); blocking. Returns True if any were new."""
+        aliases = [a for a in aliases if a not in self.aliases]
+        if not aliases: return False
+        db = get_db()
+        with db_lock:
+            rows = db.execute(f"SELECT alias, canonical FROM track_aliases WHERE alias IN ({','.join('?' * len(aliases))})", aliases).fetchall()
+        for alias, canonical in rows: self._add(alias, canonical)
+        return bool(rows)
+
+    def alias_of(self, canonical, prefix):
+        for alias in self.by_canonical.get(canonical, ()):
+            if alias.startswith(prefix + ":"): return alias.split(":", 1)[1]
+        return None
+
+    def link(self, canonical, aliases):
+        """Maps new aliases to canonical; an alias keeps the first canonical it was linked to."""
+        if not self.ready: self.load()
+        new = [a for a in dict.fromkeys(aliases + [f"key:{canonical}"]) if a not in self.aliases]
+        if not new: return
+        for alias in new: self._add(alias, canonical)
+        with self.lock: self.pending += [(a, canonical) for a in new]
+
+    def flush(self):
+        """Writes aliases linked since the last flush; called from cache_maintenance_loop."""
+        with self.lock: rows, self.pending = self.pending, []
+        if not rows: return
+        try:
+            db = get_db()
+            with db_lock, db: db.executemany("INSERT OR IGNORE INTO track_aliases VALUES (?, ?)", rows)
+        except Exception as e:
+            logger.error(f"Track index write failed: {e}")
+            with self.lock: self.pending = rows + self.pending
+
+track_index = TrackIndex()
+
+class MediaCache:
+    """
+    Content-addressed local store for finished MP3s and covers. Files are named
+    by their SHA-256, indexed by video ID and canonical track key, and evicted
+    least-recently-used once MEDIA_CACHE_BYTES is exceeded. A hit lets
+    process_media skip yt-dlp and ffmpeg for that file.
+    """
+    def __init__(self, root, budget):
+        self.root = root
+        self.budget = budget
+        self.blobs = {}
+        self.index = {}
+        self.touched = set()
+        self.total = 0
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        self.ready = False
+
+    def load(self):
+        os.makedirs(self.root, exist_ok=True)
+        db = get_db()
+        with db_lock, db:
+            db.execute("CREATE TABLE IF NOT EXISTS media_blobs (digest TEXT PRIMARY KEY, path TEXT NOT NULL, size INTEGER, last_used REAL)")
+            db.execute("CREATE TABLE IF NOT EXISTS media_index (key TEXT, kind TEXT, digest TEXT NOT NULL, meta TEXT, PRIMARY KEY (key, kind))")
+            blobs = db.execute("SELECT digest, path, size, last_used FROM media_blobs").fetchall()
+            index = db.execute("SELECT key, kind, digest, meta FROM media_index").fetchall()
+        missing = []
+        with self.lock:
+            for digest, path, size, last_used in blobs:
+                if os.path.exists(path):
+                    self.blobs[digest] = [path, size, last_used]
+                    self.total += size
+                else: missing.append((digest,))
+            for key, kind, digest, meta in index:
+                if digest in self.blobs: self.index[(key, kind)] = (digest, json.loads(meta or '{}'))
+        if missing: self._forget(missing)
+        self.ready = True
+
+    def owns(self, path):
+        return os.path.abspath(path).startswith(os.path.abspath(self.root) + os.sep)
+
+    def lookup(self, keys, kind, count=True):
+        """(path, meta) of the first key with a cached file of this kind, or None."""
+        if not self.ready: self.load()
+        found = self._find(keys, kind)
+        if count:
+            with self.lock: self.stats['hits' if found else 'misses'] += 1
+        return found
+
+    def _find(self, keys, kind):
+        with self.lock:
+            for key in keys:
+                hit = self.index.get((key, kind))
+                blob = self.blobs.get(hit[0]) if hit else None
+                if blob and os.path.exists(blob[0]):
+                    blob[2] = time.time()
+                    self.touched.add(hit[0])
+                    return blob[0], dict(hit[1])
+        return None
+
+    def reload(self, keys):
+        """Picks up files of any kind other worker processes cached since load(); blocking. Returns True if any were found."""
+        if not keys: return False
+        db = get_db()
+        with db_lock:
+            rows = db.execute("SELECT i.key, i.kind, i.digest, i.meta, b.path, b.size, b.last_used FROM media_index i "
+                              f"JOIN media_blobs b ON b.digest = i.digest WHERE i.key IN ({','.join('?' * len(keys))})",
+                              keys).fetchall()
+        with self.lock:
+            for key, kind, digest, meta, path, size, last_used in rows:
+                if digest not in self.blobs:
+                    self.blobs[digest] = [path, size, last_used]
+                    self.total += size
+                self.index[(key, kind)] = (digest, json.loads(meta or '{}'))
+        return bool(rows)
+
+    def store(self, path, kind, keys, meta):
+        """Moves a finished file into the cache and returns its cached path."""
+        if not self.ready: self.load()
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''): sha.update(block)
+        digest = sha.hexdigest()
+        dest = os.path.join(self.root, digest[:2], digest + os.path.splitext(path)[1].lower())
+        now = time.time()
+        with self.lock:
+            if digest in self.blobs and os.path.exists(self.blobs[digest][0]):
+                os.remove(path)
+                dest = self.blobs[digest][0]
+                self.blobs[digest][2] = now
+            else:
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                shutil.move(path, dest)
+                size = os.path.getsize(dest)
+                self.blobs[digest] = [dest, size, now]
+                self.total += size
+            for key in keys: self.index[(key, kind)] = (digest, meta)
+            victims = self._pick_victims(digest)
+        try:
+            db = get_db()
+            with db_lock, db:
+                db.execute("INSERT OR REPLACE INTO media_blobs VALUES (?, ?, ?, ?)", (digest, dest, self.blobs[digest][1], now))
+                db.executemany("INSERT OR REPLACE INTO media_index VALUES (?, ?, ?, ?)",
+                               [(key, kind, digest, json.dumps(meta, ensure_ascii=False)) for key in keys])
+        except Exception as e:
+            logger.error(f"Media cache write failed: {e}")
+        if victims: self._evict(victims)
+        return dest
+
+    def _pick_victims(self, keep):
+        victims = []
+        for digest in sorted(self.blobs, key=lambda d: self.blobs[d][2]):
+            if self.total <= self.budget: break
+            if digest == keep: continue
+            path, size, _ = self.blobs.pop(digest)
+            self.total -= size
+            victims.append((digest, path))
+        if victims:
+            gone = {d for d, _ in victims}
+            self.index = {k: v for k, v in self.index.items() if v[0] not in gone}
+            self.stats['evictions'] += len(victims)
+        return victims
+
+    def _evict(self, victims):
+        for _, path in victims:
+            try: os.remove(path)
+            except OSError: pass
+        self._forget([(d,) for d, _ in victims])
+        logger.info(f"Media cache evicted {len(victims)} file(s), {human_readable_size(self.total)} kept, stats {self.stats}")
+
+    def _forget(self, digests):
+        try:
+            db = get_db()
+            with db_lock, db:
+                db.executemany("DELETE FROM media_blobs WHERE digest = ?", digests)
+                db.executemany("DELETE FROM media_index WHERE digest = ?", digests)
+        except Exception as e:
+            logger.error(f"Media cache cleanup failed: {e}")
+
+    def flush(self):
+        """Persists last-used times of blobs hit since the previous flush."""
+        with self.lock:
+            rows = [(self.blobs[d][2], d) for d in self.touched if d in self.blobs]
+            self.touched.clear()
+        if not rows: return
+        try:
+            db = get_db()
+            with db_lock, db: db.executemany("UPDATE media_blobs SET last_used = ? WHERE digest = ?", rows)
+        except Exception as e:
+            logger.error(f"Media cache flush failed: {e}")
+
+media_cache = MediaCache(MEDIA_CACHE_DIR, MEDIA_CACHE_BYTES)
+
+def media_cache_keys(unique_key, aliases):
+    """Media cache keys of a track: its canonical key plus every video ID alias."""
+    keys = [unique_key] if unique_key else []
+    return list(dict.fromkeys(keys + [a for a in aliases if a.startswith(('yt:', 'sc:'))]))
+
+async def sync_shared_stores(aliases, fallback=None):
+    """
+    Worker mode: pulls what other processes wrote for one track (aliases,
+    cache entry, media-cache files) into memory on db_executor, so the
+    synchronous lookups that follow never query SQLite on the event loop.
+    """
+    if not WORKER_COUNT: return
+    def pull():
+        track_index.reload(aliases)
+        key = track_index.resolve(aliases) or fallback
+        if key: global_cache.reload(key)
+        media_cache.reload(media_cache_keys(key, aliases))
+    await asyncio.get_running_loop().run_in_executor(db_executor, pull)
+
+def fetch_thumbnail(info, opts):
+    """Writes only the thumbnail of a resolved track. Returns (path, stem)."""
+    opts = dict(opts, writethumbnail=True, skip_download=True)
+    with ydl_pool.acquire(opts) as ydl:
+        ydl.process_ie_result(copy.deepcopy(info), download=True)
+        stem = os.path.splitext(ydl.prepare_filename(info))[0]
+    for ext in ['.webp', '.jpg', '.png']:
+        if os.path.exists(stem + ext): return stem + ext, stem
+    return None, stem
+
+def prepare_cover(src, stem):
+    """
+    Decodes a downloaded thumbnail once and writes two JPEGs: a width-capped
+    display image for the banner photo and a square COVER_THUMB_SIZE thumbnail
+    for the APIC frame and Telegram's thumbnail field. Returns (display, thumb);
+    both are the source file if ffmpeg fails.
+    """
+    display, thumb = stem + '.cover.jpg', stem + '.thumb.jpg'
+    graph = (f"[0:v]split=2[d][t];[d]scale='min({COVER_DISPLAY_WIDTH},iw)':-2[display];"
+             f"[t]crop='min(iw,ih)':'min(iw,ih)',scale={COVER_THUMB_SIZE}:{COVER_THUMB_SIZE}[thumb]")
+    cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', '-i', src, '-filter_complex', graph,
+           '-map', '[display]', '-frames:v', '1', '-q:v', '3', display,
+           '-map', '[thumb]', '-frames:v', '1', '-q:v', '5', thumb]
+    try:
+        subprocess.run(cmd, check=True, capture_output=True, timeout=30)
+    except Exception as e:
+        logger.warning(f"Cover processing failed, using the original: {e}")
+        for path in (display, thumb):
+            if os.path.exists(path): os.remove(path)
+        return src, src
+    os.remove(src)
+    return display, thumb
+
+@timed('thumbnail')
+def fetch_cover(info, opts, keys):
+    """Fetches, processes and caches a track's cover. Returns (display, thumb, meta) or None."""
+    raw, stem = fetch_thumbnail(info, opts)
+    if not raw: return None
+    display, thumb = prepare_cover(raw, stem)
+    meta = {'title': info.get('title', 'Music')}
+    stored = media_cache.store(display, 'cover', keys, meta)
+    thumb = media_cache.store(thumb, 'thumb', keys, meta) if thumb != display else stored
+    return stored, thumb, meta
+
+def is_streamable(info):
+    return bool(info.get('url')) and info.get('protocol') in ('http', 'https') and not info.get('requested_formats')
+
+@timed('download')
+def download_audio(info, opts, hook):
+    """Streams into ffmpeg when the format allows it, otherwise falls back to yt-dlp's postprocessor."""
+    if STREAM_ENCODE and is_streamable(info):
+        try: return stream_download_encode(info, opts, hook)
+        except yt_dlp.utils.DownloadError: raise
+        except Exception as e: logger.warning(f"Streaming encode failed, falling back: {e}")
+    return blocking_download(info, opts, hook)
+
+def stream_download_encode(info, opts, hook):
+    """
+    Pipes the audio bytes into ffmpeg while they arrive, so encoding overlaps
+    the transfer and no intermediate file is written. Returns (mp3, stem).
+    """
+    with ydl_pool.acquire(opts) as ydl:
+        stem = os.path.splitext(ydl.prepare_filename(info))[0]
+        mp3 = stem + '.mp3'
+        duration = info.get('duration') or 0
+        # The response's Content-Range/Content-Length is authoritative; the extractor's approximate size only feeds the progress bar.
+        total = 0
+        approx = info.get('filesize') or info.get('filesize_approx') or 0
+        chunk = (info.get('downloader_options') or {}).get('http_chunk_size') or 0
+        headers = dict(info.get('http_headers') or {})
+        encoded = [0.0]
+
+        def start_encoder():
+            proc = subprocess.Popen(
+                ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', '-i', 'pipe:0', '-vn',
+                 '-codec:a', 'libmp3lame', '-b:a', '320k', '-progress', 'pipe:1', '-nostats', mp3],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+            def read_progress():
+                for line in proc.stdout:
+                    key, _, value = line.decode(errors='ignore').strip().partition('=')
+                    if key == 'out_time_us' and value.isdigit(): encoded[0] = int(value) / 1e6
+
+            reader = threading.Thread(target=read_progress, daemon=True)
+            reader.start()
+            return proc, reader
+
+        def stop_encoder():
+            proc.kill()
+            proc.wait()
+            if os.path.exists(mp3): os.remove(mp3)
+
+        proc, reader = start_encoder()
+        downloaded = 0
+        failures = 0
+        retries = opts.get('retries', 10)
+        start = time.time()
+        try:
+            while True:
+                req_headers = dict(headers)
+                if chunk: req_headers['Range'] = f"bytes={downloaded}-{downloaded + chunk - 1}"
+                elif downloaded: req_headers['Range'] = f"bytes={downloaded}-"
+                received = 0
+                try:
+                    resp = ydl.urlopen(Request(info['url'], headers=req_headers))
+                    if downloaded and resp.status != 206:
+                        # The server sent the whole file again: start over with a fresh encoder instead of failing.
+                        logger.warning(f"Server ignored the resume range at {downloaded} bytes, restarting from byte 0")
+                        stop_encoder()
+                        proc, reader = start_encoder()
+                        downloaded, encoded[0] = 0, 0.0
+                    content_range = resp.headers.get('Content-Range') or ''
+                    if '/' in content_range and content_range.rsplit('/', 1)[1].isdigit():
+                        total = int(content_range.rsplit('/', 1)[1])
+                    elif resp.status == 200 and resp.headers.get('Content-Length', '').isdigit():
+                        total = int(resp.headers['Content-Length'])
+
+                    while True:
+                        data = resp.read(64 * 1024)
+                        if not data: break
+                        proc.stdin.write(data)
+                        downloaded += len(data)
+                        received += len(data)
+                        elapsed = max(time.time() - start, 0.001)
+                        hook({'status': 'downloading', 'downloaded_bytes': downloaded, 'total_bytes': total or approx,
+                              'elapsed': elapsed, 'speed': downloaded / elapsed,
+                              'encoded_seconds': encoded[0], 'duration': duration})
+                    if total and downloaded < total and (not chunk or not received):
+                        raise RequestError(f"Connection closed at {downloaded} of {total} bytes")
+                except RequestError as e:
+                    # Transient transfer errors resume from the last byte, like yt-dlp's own downloader.
+                    failures += 1
+                    if failures > retries: raise yt_dlp.utils.DownloadError(f"{e} (giving up after {retries} retries)")
+                    metrics.inc('retries', stage='download')
+                    logger.warning(f"Stream interrupted at {downloaded} bytes, resuming ({failures}/{retries}): {e}")
+                    time.sleep(min(failures, 5))
+                    continue
+                failures = 0
+
+                if not chunk or resp.status != 206 or not total or downloaded >= total: break
+
+            proc.stdin.close()
+            with metrics.timer('encode'): proc.wait()
+            if proc.returncode != 0:
+                raise RuntimeError(f"ffmpeg exited with {proc.returncode}: {proc.stderr.read().decode(errors='ignore')[-300:]}")
+        except BaseException:
+            stop_encoder()
+            raise
+        reader.join(1)
+
+    hook({'status': 'finished', 'downloaded_bytes': downloaded, 'total_bytes': total or downloaded, 'filename': mp3,
+          'encoded_seconds': duration, 'duration': duration})
+    return mp3, stem
+
+def blocking_download(info, opts, hook):
+    """Downloads and encodes a resolved track without extracting it again. Returns (mp3, stem)."""
     opts['progress_hooks'] = [hook]
-    with yt_dlp.YoutubeDL(opts) as ydl: return ydl.extract_info(url, download=True)
+    started = {}
 
+    def pp_hook(d):
+        if d.get('status') == 'started': started[d.get('postprocessor')] = time.perf_counter()
+        elif d.get('status') == 'finished' and d.get('postprocessor') in started:
+            metrics.observe('encode', time.perf_counter() - started.pop(d['postprocessor']))
+
+    opts['postprocessor_hooks'] = [pp_hook]
+    with yt_dlp.YoutubeDL(opts) as ydl:
+        ydl.process_ie_result(copy.deepcopy(info), download=True)
+        stem = os.path.splitext(ydl.prepare_filename(info))[0]
+    return stem + '.mp3', stem
+
+@timed('embed')
 def embed_cover(mp3, img, info, artist_name=""):
     try:
         audio = MP3(mp3, ID3=ID3)
         try: audio.add_tags()
         except: pass
-        with open(img, 'rb') as f: audio.tags.add(APIC(encoding=3, mime='image/jpeg', type=3, desc='Cover', data=f.read()))
+        mime = COVER_MIME.get(os.path.splitext(img)[1].lower(), 'image/jpeg')
+        with open(img, 'rb') as f: audio.tags.add(APIC(encoding=3, mime=mime, type=3, desc='Cover', data=f.read()))
         audio.tags.add(TIT2(encoding=3, text=info.get('title','')))
         final_artist = artist_name if artist_name else info.get('uploader','')
         audio.tags.add(TPE1(encoding=3, text=final_artist))
@@ -866,7 +2850,8 @@ def make_progress_bar(percent):
     filled = int(percent / 10)
     return "▰" * filled + "▱" * (10 - filled)
 
-async def update_status_message(status_dict, message, chat_id):
+def render_progress_text(status_dict, chat_id):
+    """Status text for a yt-dlp progress dict; rendered by status_renderer at flush time."""
     status = status_dict.get('status')
     text = ""
     
@@ -924,34 +2909,127 @@ async def update_status_message(status_dict, message, chat_id):
                 f"💾 Size: <b>{size_str}</b>\n"
                 f"{time_label}: <b>{eta_str}</b>"
             )
+
+            if 'encoded_seconds' in status_dict:
+                duration = status_dict.get('duration') or 0
+                ep = min(status_dict['encoded_seconds'] / duration * 100, 100) if duration else 0
+                text = text.replace("📥 <b>Downloading...</b>", "📥 <b>Downloading & Encoding...</b>", 1)
+                text += f"\n\n🎛 Encode: {make_progress_bar(ep)} <b>{int(ep)}%</b>"
         except Exception:
             text = f"📥 <b>Downloading...</b>"
-    
-    if text and message.text != text:
-        await safe_edit(message, text, chat_id)
-
-async def safe_edit(message, text, chat_id, remove_keyboard=False):
-    try:
-        kb = InlineKeyboardMarkup([[InlineKeyboardButton("Cancel Operation ❌", callback_data=f'cancel_dl_{chat_id}')]]) if not remove_keyboard else None
-        await message.edit_text(text, parse_mode=ParseMode.HTML, reply_markup=kb)
-    except RetryAfter as e: await asyncio.sleep(e.retry_after)
-    except Exception: pass
-
-def get_history_file(user_id):
-    return os.path.join(get_user_folder(user_id), "history.json")
+    return text
+
+class StatusState:
+    __slots__ = ('message', 'chat_id', 'content', 'remove_keyboard', 'cancel_data', 'sent', 'last_edit', 'touched')
+
+    def __init__(self, message, chat_id):
+        self.message = message
+        self.chat_id = chat_id
+        self.content = None
+        self.remove_keyboard = False
+        self.cancel_data = None
+        self.sent = None
+        self.last_edit = 0
+        self.touched = 0
+
+class StatusRenderer:
+    """
+    Single writer for status message edits. Producers (handlers, the scheduler,
+    download hooks on worker threads) only store the latest content per
+    message; run() flushes on a fixed tick with a per-message interval, a
+    global edit budget and per-chat RetryAfter back-off, and never calls the
+    API for text that has not changed. Content may be a callable, rendered at
+    flush time.
+    """
+    def __init__(self):
+        self.states = {}
+        self.blocked = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(message):
+        return (message.chat_id, message.message_id)
+
+    def set(self, message, chat_id, content, remove_keyboard=False, cancel_data=None):
+        with self.lock:
+            st = self.states.get(self.key(message))
+            if not st: st = self.states[self.key(message)] = StatusState(message, chat_id)
+            if st.remove_keyboard and not remove_keyboard: return
+            st.content, st.remove_keyboard, st.cancel_data = content, remove_keyboard, cancel_data
+            st.touched = time.monotonic()
+
+    def drop(self, message):
+        with self.lock: self.states.pop(self.key(message), None)
+
+    def due(self, now):
+        """(state, text, markup) for every message whose rendered view changed and may be edited now."""
+        with self.lock: states = list(self.states.items())
+        out = []
+        for key, st in states:
+            if len(out) >= STATUS_EDITS_PER_TICK: break
+            if now < self.blocked.get(st.chat_id, 0): continue
+            if not st.remove_keyboard and now - st.last_edit < STATUS_MIN_INTERVAL: continue
+            try: text = st.content() if callable(st.content) else st.content
+            except Exception: text = None
+            view = (text, st.remove_keyboard, st.cancel_data)
+            if not text or view == st.sent:
+                if st.remove_keyboard or now - st.touched > STATUS_IDLE_TTL:
+                    with self.lock:
+                        if self.states.get(key) is st: del self.states[key]
+                continue
+            out.append((st, view))
+        return out
+
+    async def edit(self, st, view):
+        text, remove_keyboard, cancel_data = view
+        kb = InlineKeyboardMarkup([[InlineKeyboardButton("Cancel Operation ❌", callback_data=cancel_data or f'cancel_dl_{st.chat_id}')]]) if not remove_keyboard else None
+        st.last_edit = time.monotonic()
+        try:
+            await st.message.edit_text(text, parse_mode=ParseMode.HTML, reply_markup=kb)
+            st.sent = view
+        except RetryAfter as e:
+            self.blocked[st.chat_id] = time.monotonic() + retry_after_seconds(e)
+        except BadRequest as e:
+            if "not found" in str(e).lower(): self.drop(st.message)
+            else: st.sent = view
+        except Exception: pass
+
+    async def flush(self):
+        now = time.monotonic()
+        for chat_id in [c for c, until in self.blocked.items() if until <= now]: del self.blocked[chat_id]
+        due = self.due(now)
+        if due: await asyncio.gather(*(self.edit(st, view) for st, view in due))
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(STATUS_TICK)
+            try: await self.flush()
+            except Exception as e: logger.error(f"Status flush failed: {e}")
+
+status_renderer = StatusRenderer()
+
+class JobProgressWriter(StatusRenderer):
+    """
+    Status sink of a worker process: the same throttled views, written to the
+    job's row in job_queue for the front end to render instead of edited in
+    Telegram.
+    """
+    def __init__(self):
+        super().__init__()
+        self.jobs = {}
 
-def load_history(user_id):
-    try:
-        with open(get_history_file(user_id), 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except: return {}
+    async def edit(self, st, view):
+        st.last_edit = time.monotonic()
+        job_id = self.jobs.get(self.key(st.message))
+        try:
+            if job_id: await asyncio.get_running_loop().run_in_executor(db_executor, job_queue.progress, job_id, view)
+            st.sent = view
+        except Exception as e:
+            logger.error(f"Job progress write failed: {e}")
 
-def save_to_history(user_id, unique_key, message_id):
-    """Saves song signature and channel message ID"""
-    hist = load_history(user_id)
-    hist[unique_key] = message_id
-    with open(get_history_file(user_id), 'w', encoding='utf-8') as f:
-        json.dump(hist, f, ensure_ascii=False)
+async def safe_edit(message, text, chat_id, remove_keyboard=False, cancel_data=None):
+    """Queues the status text; status_renderer applies it on its next tick."""
+    status_renderer.set(message, chat_id, text, remove_keyboard=remove_keyboard, cancel_data=cancel_data)
 
 def get_message_link(chat_id, message_id, username=None):
     """Generates a direct link to a message in a channel"""
@@ -961,7 +3039,7 @@ def get_message_link(chat_id, message_id, username=None):
         clean_id = str(chat_id).replace("-100", "")
         return f"https://t.me/c/{clean_id}/{message_id}"
 
-def get_lyrics_smart(artist, title):
+async def get_lyrics_smart(artist, title):
     """
     V6 Engine: With STRICT Verification to avoid garbage results.
     """
@@ -987,55 +3065,314 @@ def get_lyrics_smart(artist, title):
     if clean_title_en:
         queries.append(clean_title_en)
 
+    cache_key = f"{clean_artist_en}_{clean_title_en}".lower()
+    loop = asyncio.get_running_loop()
+    cached = await loop.run_in_executor(db_executor, lyrics_cache.get, cache_key)
+    if cached is not None: return cached['lyrics'], cached['source']
+
     logger.info(f"Searching: {queries}")
+    lyrics, source, track = await race_lyrics_sources(queries, clean_artist_en, clean_title_en)
 
+    # A miss is only cached when every source actually answered.
+    if source != LOOKUP_ERROR: await loop.run_in_executor(db_executor, lyrics_cache.put, cache_key, lyrics, source, track)
+    return lyrics, source
+
+async def race_lyrics_sources(queries, clean_artist_en, clean_title_en):
+    """
+    Starts LrcLib and Genius for every query at once. Priority keeps the old
+    serial order (per query: LrcLib, then Genius), so a result is returned as
+    soon as every better-ranked lookup has finished empty; the rest are cancelled.
+    Returns (lyrics, source, lrclib_track); source is LOOKUP_ERROR when nothing
+    was found and at least one lookup failed instead of answering.
+    """
+    async def from_lrclib(query):
+        track = await search_lrclib(query, clean_artist_en, clean_title_en)
+        if track == LOOKUP_ERROR: return None, LOOKUP_ERROR, None
+        if not track: return None, None, None
+        if track.get('syncedLyrics'): return track['syncedLyrics'], "LrcLib (Synced)", track
+        return track['plainLyrics'], "LrcLib (Plain)", track
+
+    async def from_genius(query):
+        lyrics, source = await search_genius_direct(query, clean_title_en)
+        return lyrics, source, None
+
+    lookups = []
     for query in queries:
         if len(query) < 2: continue
+        lookups.append(asyncio.create_task(from_lrclib(query)))
+        if clean_artist_en in query and len(query) > 5:
+            lookups.append(asyncio.create_task(from_genius(query)))
 
-        try:
-            url = "https://lrclib.net/api/search"
-            params = {'q': query}
-            resp = requests.get(url, params=params, timeout=4)
-            if resp.status_code == 200:
-                results = resp.json()
-                if results and isinstance(results, list):
-                    for track in results[:3]:
-                        if track.get('instrumental'): continue
-                        
-                        res_artist = track.get('artistName', '')
-                        res_track = track.get('trackName', '')
-                        
-                        if clean_artist_en and len(clean_artist_en) > 2:
-                            if not check_similarity(clean_artist_en, res_artist):
-                                continue
-                        
-                        if not check_similarity(clean_title_en, res_track):
+    pending = set(lookups)
+    try:
+        while pending:
+            _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in lookups:
+                if not task.done(): break
+                if task.result()[0]: return task.result()
+        return None, LOOKUP_ERROR if any(t.result()[1] == LOOKUP_ERROR for t in lookups) else None, None
+    finally:
+        for task in pending: task.cancel()
+
+async def search_lrclib(query, clean_artist_en, clean_title_en):
+    """ Source 1: LrcLib. Returns the first verified track with lyrics, or LOOKUP_ERROR when LrcLib could not be reached. """
+    try:
+        url = f"{LRCLIB_URL}/api/search"
+        params = {'q': query}
+        resp = await http_pool.get(url, params=params)
+        if resp.status_code == 429 or resp.status_code >= 500: return LOOKUP_ERROR
+        if resp.status_code == 200:
+            results = resp.json()
+            if results and isinstance(results, list):
+                for track in results[:3]:
+                    if track.get('instrumental'): continue
+                    
+                    res_artist = track.get('artistName', '')
+                    res_track = track.get('trackName', '')
+                    
+                    if clean_artist_en and len(clean_artist_en) > 2:
+                        if not check_similarity(clean_artist_en, res_artist):
                             continue
+                    
+                    if not check_similarity(clean_title_en, res_track):
+                        continue
 
-                        if track.get('syncedLyrics'): return track['syncedLyrics'], "LrcLib (Synced)"
-                        if track.get('plainLyrics'): return track['plainLyrics'], "LrcLib (Plain)"
-        except: pass
+                    if track.get('syncedLyrics') or track.get('plainLyrics'): return track
+    except Exception as e:
+        logger.warning(f"LrcLib lookup failed for {query!r}: {e}")
+        return LOOKUP_ERROR
+    return None
+
+class LyricsCache:
+    """
+    Lyrics results keyed on the normalized artist/title, stored in SQLite.
+    Hits (with both LrcLib variants) live for LYRICS_TTL, "not found" for
+    LYRICS_NEGATIVE_TTL, and the table is trimmed to LYRICS_CACHE_MAX rows.
+    """
+    def __init__(self):
+        self.ready = False
+        self.writes = 0
+
+    def ensure(self):
+        if self.ready: return get_db()
+        db = get_db()
+        with db_lock, db:
+            db.execute("CREATE TABLE IF NOT EXISTS lyrics_cache (key TEXT PRIMARY KEY, lyrics TEXT, source TEXT, synced TEXT, plain TEXT, expires_at REAL, updated_at REAL)")
+            db.execute("CREATE INDEX IF NOT EXISTS lyrics_cache_updated ON lyrics_cache (updated_at)")
+        self.ready = True
+        return db
+
+    def get(self, key):
+        try:
+            db = self.ensure()
+            with db_lock:
+                row = db.execute("SELECT lyrics, source, synced, plain FROM lyrics_cache WHERE key = ? AND expires_at > ?", (key, time.time())).fetchone()
+        except Exception as e:
+            logger.error(f"Lyrics cache read failed: {e}")
+            return None
+        if not row: return None
+        return {'lyrics': row[0], 'source': row[1], 'synced': row[2], 'plain': row[3]}
+
+    def put(self, key, lyrics, source, track=None):
+        now = time.time()
+        ttl = LYRICS_TTL if lyrics else LYRICS_NEGATIVE_TTL
+        synced = track.get('syncedLyrics') if track else None
+        plain = track.get('plainLyrics') if track else None
+        try:
+            db = self.ensure()
+            with db_lock, db:
+                db.execute("INSERT OR REPLACE INTO lyrics_cache VALUES (?, ?, ?, ?, ?, ?, ?)", (key, lyrics, source, synced, plain, now + ttl, now))
+                self.writes += 1
+                if self.writes % CACHE_TRIM_EVERY == 1: self.trim(db, now)
+        except Exception as e:
+            logger.error(f"Lyrics cache write failed: {e}")
+
+    def trim(self, db, now):
+        db.execute("DELETE FROM lyrics_cache WHERE expires_at <= ?", (now,))
+        db.execute("DELETE FROM lyrics_cache WHERE key IN (SELECT key FROM lyrics_cache ORDER BY updated_at DESC LIMIT -1 OFFSET ?)", (LYRICS_CACHE_MAX,))
+
+lyrics_cache = LyricsCache()
+
+async def run_claimed(job, context, slots):
+    """Runs one job claimed from job_queue in this worker process and records its outcome."""
+    job_id, kind, chat_id, payload = job
+    status_msg = Message.de_json(payload['status'], context.bot)
+    origin_msg = Message.de_json(payload['origin'], context.bot)
+    if origin_msg.from_user:
+        # The front end's view of the user's channel; this process' copy may be stale.
+        with user_store.lock:
+            if payload.get('channel'): user_store.profiles[origin_msg.from_user.id] = payload['channel']
+            else: user_store.profiles.pop(origin_msg.from_user.id, None)
+    status_renderer.jobs[StatusRenderer.key(status_msg)] = job_id
+    claimed_jobs[job_id] = chat_id
+    user_states[chat_id] = {'running': True, 'start_time': time.time(), 'job_id': job_id}
+    state, result = 'failed', None
+    try:
+        # Sends to the channel happen in the front end, so "View in Channel" needs its history.
+        if origin_msg.from_user: await asyncio.get_running_loop().run_in_executor(db_executor, user_store.reload_history, origin_msg.from_user.id)
+        # Not 'job'/'jobs': the front end counts and times every job end to end, and merges these in.
+        with metrics.timer('worker_job'):
+            if kind == 'batch':
+                await process_batch(payload['links'], chat_id, status_msg, context, origin_msg)
+                result = batch_results.pop(job_id, None)
+            else:
+                result = await process_media(payload['url'], payload['platform'], chat_id, status_msg, context, origin_msg)
+        state = 'done' if user_states[chat_id]['running'] else 'cancelled'
+    except asyncio.CancelledError:
+        state = 'queued'
+        raise
+    except Exception as e:
+        logger.error(f"Job {job_id} failed: {e}")
+    finally:
+        if state != 'queued': await status_renderer.flush()
+        status_renderer.drop(status_msg)
+        status_renderer.jobs.pop(StatusRenderer.key(status_msg), None)
+        claimed_jobs.pop(job_id, None)
+        user_states.pop(chat_id, None)
+        metrics.inc('worker_jobs', result=state)
+        try:
+            def write_back():
+                job_queue.finish(job_id, state, result)
+                global_cache.flush()
+                track_index.flush()
+            await asyncio.get_running_loop().run_in_executor(db_executor, write_back)
+        except Exception as e:
+            logger.error(f"Job {job_id} result write failed: {e}")
+        finally:
+            slots.release()
 
-        if clean_artist_en in query and len(query) > 5: 
-            lyrics, source = search_genius_direct(query)
-            if lyrics: return lyrics, source
+async def job_heartbeat_loop():
+    """Keeps this worker's jobs alive in job_queue and stops the ones the front end cancelled."""
+    loop = asyncio.get_running_loop()
+    last_beat = 0
+    while True:
+        await asyncio.sleep(JOB_POLL_INTERVAL)
+        job_ids = list(claimed_jobs)
+        try:
+            if time.monotonic() - last_beat > JOB_HEARTBEAT_INTERVAL:
+                last_beat = time.monotonic()
+                await loop.run_in_executor(db_executor, job_queue.heartbeat, job_ids)
+            for job_id in await loop.run_in_executor(db_executor, job_queue.cancelled, job_ids):
+                state = user_states.get(claimed_jobs.get(job_id))
+                if state: state['running'] = False
+        except Exception as e:
+            logger.error(f"Job heartbeat failed: {e}")
 
-    return None, None
+async def run_worker(n):
+    """
+    Worker process n (python HaveIT.py worker <n>): claims jobs from job_queue
+    and runs up to WORKER_JOBS of them at a time with its own bot connection.
+    On SIGTERM it stops claiming, hands unfinished jobs back and flushes its stores.
+    """
+    global status_renderer, track_slots
+    status_renderer = JobProgressWriter()
+    track_slots = asyncio.Semaphore(WORKER_JOBS)
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT): loop.add_signal_handler(sig, stop.set)
+    request = HTTPXRequest(connection_pool_size=WORKER_JOBS * 4, connect_timeout=300, read_timeout=300, write_timeout=300)
+    bot = ExtBot(BOT_TOKEN, base_url=TELEGRAM_BASE_URL, base_file_url=TELEGRAM_BASE_FILE_URL, request=request,
+                 local_mode=TELEGRAM_LOCAL_MODE, rate_limiter=OutboundLimiter())
+    context = SimpleNamespace(bot=bot)
+    slots = asyncio.Semaphore(WORKER_JOBS)
+    name = f"{os.uname().nodename}:{os.getpid()}"
+    async with bot:
+        spawn(cache_maintenance_loop())
+        spawn(status_renderer.run())
+        spawn(job_heartbeat_loop())
+        spawn(metrics_sync_loop(n))
+        logger.info(f"Worker {n} ({name}) ready with {WORKER_JOBS} job slots.")
+        while not stop.is_set():
+            try: job = None if slots.locked() else await loop.run_in_executor(db_executor, job_queue.claim, name)
+            except Exception as e:
+                logger.error(f"Job claim failed: {e}")
+                job = None
+            if job:
+                await slots.acquire()
+                spawn(run_claimed(job, context, slots))
+                continue
+            with contextlib.suppress(asyncio.TimeoutError): await asyncio.wait_for(stop.wait(), JOB_POLL_INTERVAL)
+        tasks = list(background_tasks)
+        for task in tasks: task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    metrics.publish(n)
+    global_cache.flush()
+    user_store.flush()
+    media_cache.flush()
+    track_index.flush()
+    spotify_resolver.flush()
+    await http_pool.close()
+    logger.info(f"Worker {n} stopped.")
+
+async def supervise_worker(n):
+    """Keeps worker process n running, restarting it whenever it exits."""
+    while True:
+        proc = worker_procs[n] = await asyncio.create_subprocess_exec(sys.executable, os.path.abspath(__file__), 'worker', str(n))
+        code = await proc.wait()
+        logger.warning(f"Worker {n} exited with code {code}, restarting in {WORKER_RESTART_DELAY}s.")
+        await asyncio.sleep(WORKER_RESTART_DELAY)
+
+async def post_init(app: Application):
+    spawn(cache_maintenance_loop())
+    spawn(status_renderer.run())
+    if ROUTE_HEALTH_INTERVAL: spawn(route_manager.health_loop())
+    if METRICS_PORT:
+        global metrics_server
+        metrics_server = await asyncio.start_server(serve_http, METRICS_HOST, METRICS_PORT)
+        logger.info(f"Metrics on http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+    if WORKER_COUNT:
+        for n in range(WORKER_COUNT): spawn(supervise_worker(n))
+        spawn(metrics_sync_loop())
+        # Jobs left by the previous run go back through the scheduler, so a chat's jobs still run one at a time.
+        for job_id, chat_id, payload in await asyncio.get_running_loop().run_in_executor(db_executor, job_queue.unfinished):
+            status = Message.de_json(payload['status'], app.bot)
+            scheduler.submit(chat_id, status, payload.get('platform') or "Batch", functools.partial(watch_job, job_id, chat_id, status))
+
+async def post_shutdown(app: Application):
+    for task in list(background_tasks): task.cancel()
+    if metrics_server: metrics_server.close()
+    for proc in worker_procs.values():
+        if proc.returncode is None: proc.terminate()
+    if worker_procs: await asyncio.wait([asyncio.ensure_future(p.wait()) for p in worker_procs.values()], timeout=30)
+    if WORKER_COUNT: metrics.collect()
+    global_cache.flush()
+    user_store.flush()
+    media_cache.flush()
+    track_index.flush()
+    spotify_resolver.flush()
+    logger.info(f"Media cache stats: {media_cache.stats}")
+    await http_pool.close()
 
 def main():
     if not BOT_TOKEN: return
     if not os.path.exists(BASE_DATA_DIR): os.makedirs(BASE_DATA_DIR)
+    global_cache.load()
+    user_store.load()
+    track_index.load()
+    media_cache.load()
+    if sys.argv[1:2] == ['worker']:
+        asyncio.run(run_worker(int(sys.argv[2]) if len(sys.argv) > 2 else 0))
+        return
     
-    app = Application.builder().token(BOT_TOKEN).connect_timeout(300).read_timeout(300).write_timeout(300).build()
+    app = (Application.builder().token(BOT_TOKEN).connect_timeout(300).read_timeout(300).write_timeout(300)
+           .base_url(TELEGRAM_BASE_URL).base_file_url(TELEGRAM_BASE_FILE_URL).local_mode(TELEGRAM_LOCAL_MODE).rate_limiter(OutboundLimiter())
+           .concurrent_updates(WEBHOOK_CONCURRENCY if WEBHOOK_URL else False)
+           .post_init(post_init).post_shutdown(post_shutdown).build())
     
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("settings", settings_command))
+    app.add_handler(CommandHandler("stats", stats_command))
     app.add_handler(CallbackQueryHandler(callback_handler))
     app.add_handler(ChatMemberHandler(on_my_chat_member_update, ChatMemberHandler.MY_CHAT_MEMBER))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
     
     print("✅ Full Fixed Bot is running...")
-    app.run_polling(allowed_updates=Update.ALL_TYPES)
+    if WEBHOOK_URL:
+        app.run_webhook(listen=WEBHOOK_LISTEN, port=WEBHOOK_PORT, url_path=WEBHOOK_PATH,
+                        webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}", secret_token=WEBHOOK_SECRET,
+                        allowed_updates=Update.ALL_TYPES)
+    else:
+        app.run_polling(allowed_updates=Update.ALL_TYPES)
 
 if __name__ == '__main__':
     main()
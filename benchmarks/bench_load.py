@@ -0,0 +1,161 @@
+"""
+End-to-end load benchmark, fully offline.
+
+Starts fake_bot_api (Telegram), media_server (pages yt-dlp's generic
+extractor resolves; only this harness routes their links, as a "Direct"
+platform) and stub_lyrics, then drives N simulated private chats through
+handle_message. Each chat sends
+--requests links picked from --tracks distinct tracks, so repeats exercise the
+caches and single-flight. Reports throughput, per-stage p50/p95/p99 from
+HaveIT.metrics and peak RSS of the bot and its ffmpeg children.
+
+With --workers N the bot runs as a front end and N worker processes
+(HAVEIT_WORKERS) do the downloads; the report merges the stage latencies
+and cache counts the workers publish when they stop.
+
+Needs ffmpeg on PATH. Runs in a scratch directory, so Users_Data starts empty.
+
+    python benchmarks/bench_load.py --chats 20 --requests 3 --tracks 10
+    python benchmarks/bench_load.py --chats 20 --requests 3 --tracks 10 --workers 4
+"""
+import argparse
+import asyncio
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from fake_bot_api import FakeBotAPI
+from media_server import MediaServer
+from stub_lyrics import StubLyricsServer
+
+STAGES = ("job", "resolve", "thumbnail", "download", "encode", "embed", "upload", "cache_send", "cache_backup", "lyrics")
+
+
+def make_update(bot, update_id, chat_id, text):
+    from telegram import Update
+    return Update.de_json({
+        "update_id": update_id,
+        "message": {"message_id": update_id, "date": int(time.time()), "text": text,
+                    "chat": {"id": chat_id, "type": "private", "first_name": f"Bench {chat_id}"},
+                    "from": {"id": chat_id, "is_bot": False, "first_name": f"Bench {chat_id}"}},
+    }, bot)
+
+
+async def run(args, H, api, media, lyrics):
+    from telegram.ext import ExtBot
+
+    chats = [100000 + i for i in range(args.chats)]
+    H.ALLOWED_CHAT_IDS[:] = chats
+    H.LRCLIB_URL = H.GENIUS_URL = lyrics.base_url
+    H.ROUTE_HEALTH_INTERVAL = 0
+    H.METRICS_SAMPLES = 100000
+    detect = H.detect_platform
+    H.detect_platform = lambda text: detect(text) or ("Direct" if f"//{media.host}/" in text else None)
+    if not args.workers: H.scheduler.max_running, H.track_slots = args.concurrency, asyncio.Semaphore(args.concurrency)
+
+    bot = ExtBot("123456:bench", base_url=api.base_url, rate_limiter=None if args.no_limiter else H.OutboundLimiter())
+    await bot.initialize()
+    context = SimpleNamespace(bot=bot)
+    await H.post_init(None)
+
+    start = time.perf_counter()
+    update_id = 0
+    for j in range(args.requests):
+        for i, chat_id in enumerate(chats):
+            update_id += 1
+            track = (i * args.requests + j) % args.tracks + 1
+            await H.handle_message(make_update(bot, update_id, chat_id, media.track_url(track)), context)
+
+    deadline = time.monotonic() + args.timeout
+    while (H.scheduler.running or H.scheduler.queues) and time.monotonic() < deadline:
+        await asyncio.sleep(0.2)
+    wall = time.perf_counter() - start
+    timed_out = bool(H.scheduler.running or H.scheduler.queues)
+
+    if args.lyrics:
+        async def lookup(n):
+            artist, title = media.title(n).split(" - ", 1)
+            with H.metrics.timer("lyrics"): await H.get_lyrics_smart(artist, title)
+        await asyncio.gather(*(lookup(n) for n in range(1, args.tracks + 1)))
+
+    await H.post_shutdown(None)
+    await bot.shutdown()
+    return wall, timed_out
+
+
+def report(args, H, api, wall, timed_out):
+    counters, hists = H.metrics.snapshot()
+    done = counters.get(("jobs", (("result", "done"),)), 0)
+    failed = counters.get(("jobs", (("result", "failed"),)), 0)
+    served = api.summary()
+    submitted = args.chats * args.requests
+    mode = f"{args.workers} workers x {H.WORKER_JOBS} jobs" if args.workers else f"{args.concurrency} concurrent jobs"
+    print(f"\n{args.chats} chats x {args.requests} requests ({args.tracks} distinct tracks), "
+          f"{mode}{' (TIMED OUT)' if timed_out else ''}")
+    print(f"wall time:   {wall:.1f}s")
+    print(f"jobs:        {done:g} done, {failed:g} failed of {submitted}")
+    print(f"throughput:  {done / wall:.2f} jobs/s ({done / wall * 60:.1f} tracks/min)")
+    print(f"telegram:    " + ", ".join(f"{m} {v['ok']}" + (f" (+{v['429']} x 429)" if v['429'] else "")
+                                       for m, v in served.items() if m in ("sendAudio", "sendPhoto", "copyMessage", "editMessageText")))
+    print(f"caches:      channel hit {counters.get(('channel_cache', (('result', 'hit'),)), 0):g} / "
+          f"miss {counters.get(('channel_cache', (('result', 'miss'),)), 0):g}, media " +
+          "/".join(f"{counters.get(('media_cache', (('result', r),)), 0):g} {r}" for r in ("hits", "misses", "evictions")))
+    print(f"\n{'stage':<13} {'n':>5} {'p50 s':>8} {'p95 s':>8} {'p99 s':>8}")
+    for stage in STAGES:
+        if stage not in hists: continue
+        p50, p95, p99 = H.metrics.percentiles(stage, 50, 95, 99, hists=hists)
+        print(f"{stage:<13} {hists[stage]['count']:>5} {p50:>8.3f} {p95:>8.3f} {p99:>8.3f}")
+    self_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    child_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    print(f"\npeak RSS:    bot {self_rss:.0f} MiB, largest child ({'worker' if args.workers else 'ffmpeg'}) {child_rss:.0f} MiB")
+    return 0 if done == submitted and not timed_out else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=2, help="links sent by each chat")
+    parser.add_argument("--tracks", type=int, default=5, help="distinct tracks on the media server")
+    parser.add_argument("--duration", type=int, default=30, help="track length in seconds")
+    parser.add_argument("--concurrency", type=int, default=3, help="MAX_CONCURRENT_JOBS for the run")
+    parser.add_argument("--workers", type=int, default=0, help="run downloads in this many worker processes")
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--flood", action="store_true", help="enforce Telegram-like per-chat flood limits")
+    parser.add_argument("--no-limiter", action="store_true")
+    parser.add_argument("--lyrics", action="store_true", help="also look up lyrics for every track")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directory")
+    args = parser.parse_args()
+
+    if not shutil.which("ffmpeg"):
+        print("ffmpeg is required on PATH")
+        return 2
+
+    workdir = tempfile.mkdtemp(prefix="haveit-bench-")
+    media = MediaServer(os.path.join(workdir, "media"), tracks=args.tracks, duration=args.duration).start()
+    api = FakeBotAPI(chat_burst=3 if args.flood else 10 ** 9).start()
+    lyrics = StubLyricsServer().start()
+
+    os.environ.update({"HAVEIT_PROXY_URL": "", "HAVEIT_METRICS_PORT": "0", "HAVEIT_WORKERS": str(args.workers), "TELEGRAM_BOT_TOKEN": "123456:bench", "TELEGRAM_BASE_URL": api.base_url})
+    os.chdir(workdir)
+    import HaveIT
+
+    try:
+        wall, timed_out = asyncio.run(run(args, HaveIT, api, media, lyrics))
+        return report(args, HaveIT, api, wall, timed_out)
+    finally:
+        for server in (media, api, lyrics): server.stop()
+        os.chdir(ROOT)
+        if args.keep: print(f"scratch directory: {workdir}")
+        else: shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""
+Flood-limit benchmark for OutboundLimiter against fake_bot_api.
+
+Each simulated job sends a burst of progress edits, a cover photo, the audio
+and a cache-channel copy to its chat, like process_media does. Reports how
+many calls failed, how many 429s the server handed out, and per-lane latency,
+with and without the limiter.
+
+    python benchmarks/bench_rate_limiter.py --chats 8 --jobs 2
+    python benchmarks/bench_rate_limiter.py --no-limiter
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import HaveIT
+from fake_bot_api import FakeBotAPI
+from telegram.error import RetryAfter
+from telegram.ext import ExtBot
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+def pct(values, q):
+    if not values: return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+
+async def run_job(bot, chat_id, edits, latencies, failures):
+    async def timed(lane, coro):
+        start = time.perf_counter()
+        try: return await coro
+        except RetryAfter: failures[lane] += 1
+        except Exception: failures[lane] += 1
+        finally: latencies[lane].append(time.perf_counter() - start)
+
+    status = await timed("message", bot.send_message(chat_id, "🔍 Checking link..."))
+    status_id = status.message_id if status else 1
+    for i in range(edits):
+        await timed("edit", bot.edit_message_text(f"📥 Downloading {i * 10}%", chat_id=chat_id, message_id=status_id))
+    await timed("delivery", bot.send_photo(HaveIT.CACHE_CHANNEL_ID, b"\xff\xd8fake"))
+    audio = await timed("delivery", bot.send_audio(HaveIT.CACHE_CHANNEL_ID, b"ID3fake"))
+    await timed("delivery", bot.copy_message(chat_id, HaveIT.CACHE_CHANNEL_ID, audio.message_id if audio else 1))
+    await timed("message", bot.delete_message(chat_id, status_id))
+
+
+async def main(args):
+    api = FakeBotAPI(flood_rate=args.flood_rate, chat_burst=args.chat_burst, latency=args.latency).start()
+    limiter = None if args.no_limiter else HaveIT.OutboundLimiter()
+    bot = ExtBot("123:fake", base_url=api.base_url, rate_limiter=limiter)
+    latencies, failures = defaultdict(list), defaultdict(int)
+    async with bot:
+        start = time.perf_counter()
+        await asyncio.gather(*(run_job(bot, 1000 + c, args.edits, latencies, failures)
+                               for c in range(args.chats) for _ in range(args.jobs)))
+        wall = time.perf_counter() - start
+    api.stop()
+
+    print(f"{'no limiter' if args.no_limiter else 'OutboundLimiter'}: {args.chats} chats x {args.jobs} jobs in {wall:.1f}s")
+    print(f"{'lane':<10} {'calls':>6} {'failed':>7} {'p50 s':>7} {'p95 s':>7}")
+    for lane in ("delivery", "message", "edit"):
+        values = latencies[lane]
+        print(f"{lane:<10} {len(values):>6} {failures[lane]:>7} {pct(values, 50):>7.2f} {pct(values, 95):>7.2f}")
+    served = api.summary()
+    print(f"server 429s: {sum(m['429'] for m in served.values())}")
+    if limiter: print(f"limiter: {limiter.stats}")
+    return 1 if failures["delivery"] else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, default=4)
+    parser.add_argument("--jobs", type=int, default=1)
+    parser.add_argument("--edits", type=int, default=5)
+    parser.add_argument("--chat-burst", type=int, default=3)
+    parser.add_argument("--flood-rate", type=float, default=0.02)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--no-limiter", action="store_true")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,143 @@
+"""
+Exercises WarpRouteManager against fake_warp_cli and a local SOCKS stand-in.
+
+The route probe goes through socks_proxy to a local HTTP endpoint; the proxy
+refuses connections while the fake tunnel is down or broken. Scenarios:
+
+- storm: many jobs hit a broken route at once, and exactly one rotation runs
+- backoff: the first connects come up broken, so the retries back off
+  exponentially up to ROUTE_BACKOFF_MAX
+- give-up: the route never heals, and rotation stops after ROUTE_MAX_ATTEMPTS
+- health: the background probe notices a route that broke and heals it
+
+Timings are scaled down; needs PySocks (requests[socks]).
+
+    python benchmarks/bench_route.py --jobs 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import HaveIT
+import fake_warp_cli
+from socks_proxy import SocksProxy
+
+
+class ProbeTarget(BaseHTTPRequestHandler):
+    def log_message(self, *args): pass
+
+    def do_GET(self):
+        self.send_response(204)
+        self.end_headers()
+
+
+def reset(**state):
+    fake_warp_cli.save(dict({"connected": True, "broken": False, "bad_connects": 0, "calls": []}, **state))
+    return HaveIT.WarpRouteManager()
+
+
+def calls(command=None):
+    return [c for c in fake_warp_cli.load()["calls"] if command in (None, c[0])]
+
+
+def overlapping():
+    spans = sorted((start, end) for _, start, end in calls())
+    return sum(1 for a, b in zip(spans, spans[1:]) if b[0] < a[1])
+
+
+async def storm(jobs):
+    manager = reset(broken=True)
+    waited = []
+
+    async def job():
+        seen = manager.generation
+        if await manager.probe(): return True
+        if manager.lock.locked():
+            start = time.perf_counter()
+            await manager.wait_healthy()
+            waited.append(time.perf_counter() - start)
+            return await manager.probe()
+        return await manager.rotate(seen)
+
+    results = await asyncio.gather(*(job() for _ in range(jobs)))
+    return {"jobs ok": f"{sum(results)}/{jobs}", "connects": len(calls("connect")), "jobs that waited": len(waited),
+            "overlapping warp calls": overlapping()}, all(results) and len(calls("connect")) == 1 and not overlapping()
+
+
+async def backoff(bad):
+    manager = reset(broken=True, bad_connects=bad)
+    ok = await manager.rotate()
+    starts = [start for _, start, _ in calls("disconnect")]
+    gaps = [round(b - a - HaveIT.WARP_DISCONNECT_WAIT - HaveIT.WARP_CONNECT_WAIT, 2) for a, b in zip(starts, starts[1:])]
+    expected = [min(HaveIT.ROUTE_BACKOFF_BASE * 2 ** i, HaveIT.ROUTE_BACKOFF_MAX) for i in range(bad)]
+    return {"healed": ok, "attempts": len(starts), "backoff gaps s": gaps, "expected at least": expected}, \
+        ok and len(starts) == bad + 1 and all(g >= e for g, e in zip(gaps, expected))
+
+
+async def give_up():
+    manager = reset(broken=True, bad_connects=10 ** 6)
+    failures = HaveIT.metrics.counters[("warp_failures", ())]
+    ok = await manager.rotate()
+    gave_up = HaveIT.metrics.counters[("warp_failures", ())] - failures
+    return {"healed": ok, "attempts": len(calls("connect")), "max attempts": HaveIT.ROUTE_MAX_ATTEMPTS,
+            "healthy after": manager.healthy.is_set()}, \
+        not ok and gave_up == 1 and len(calls("connect")) == HaveIT.ROUTE_MAX_ATTEMPTS and manager.healthy.is_set()
+
+
+async def health(interval):
+    manager = reset()
+    HaveIT.ROUTE_HEALTH_INTERVAL = interval
+    loop_task = asyncio.create_task(manager.health_loop())
+    await asyncio.sleep(interval * 2)
+    idle_rotations = len(calls("connect"))
+    broke_at = time.perf_counter()
+    fake_warp_cli.update(lambda state: state.update(broken=True))
+    while not calls("connect") and time.perf_counter() - broke_at < interval * 20: await asyncio.sleep(0.02)
+    while manager.lock.locked(): await asyncio.sleep(0.02)
+    healed_in = time.perf_counter() - broke_at
+    loop_task.cancel()
+    ok = await manager.probe()
+    return {"rotations while healthy": idle_rotations, "healed": ok, "healed in s": round(healed_in, 2)}, \
+        ok and idle_rotations == 0 and len(calls("connect")) == 1
+
+
+async def main(args):
+    workdir = tempfile.mkdtemp(prefix="haveit-route-")
+    os.environ["FAKE_WARP_STATE"] = fake_warp_cli.STATE = os.path.join(workdir, "warp.json")
+    reset()
+    target = ThreadingHTTPServer(("127.0.0.1", 0), ProbeTarget)
+    threading.Thread(target=target.serve_forever, daemon=True).start()
+    proxy = SocksProxy(fake_warp_cli.STATE).start()
+
+    HaveIT.WARP_CLI = os.path.join(ROOT, "benchmarks", "fake_warp_cli.py")
+    HaveIT.PROXY_URL = proxy.url
+    HaveIT.ROUTE_PROBE_URL = f"http://127.0.0.1:{target.server_address[1]}/"
+    HaveIT.WARP_DISCONNECT_WAIT = HaveIT.WARP_CONNECT_WAIT = 0.05
+    HaveIT.ROUTE_BACKOFF_BASE, HaveIT.ROUTE_BACKOFF_MAX = 0.2, 0.5
+
+    passed = True
+    for name, scenario in (("storm", storm(args.jobs)), ("backoff", backoff(3)), ("give-up", give_up()),
+                           ("health", health(0.2))):
+        report, ok = await scenario
+        passed &= ok
+        print(f"{name:<8} {'ok  ' if ok else 'FAIL'} " + ", ".join(f"{k}: {v}" for k, v in report.items()))
+    print(f"proxy:   {proxy.relayed} relayed, {proxy.refused} refused")
+    proxy.stop()
+    target.shutdown()
+    return 0 if passed else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=20, help="jobs that hit the broken route at once")
+    sys.exit(asyncio.run(main(parser.parse_args())))
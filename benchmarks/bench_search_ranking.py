@@ -0,0 +1,130 @@
+"""
+Offline benchmark for smart_find_best_match's ranking.
+
+Replays recorded `extract_flat` candidate lists from fixtures/search and reports
+ranking accuracy plus scoring latency, so weight changes can be checked without
+network access.
+
+    python benchmarks/bench_search_ranking.py
+    python benchmarks/bench_search_ranking.py --record "Eminem" "Mockingbird" eminem_mockingbird
+
+--record runs one live ytsearch10 through the configured proxy and saves the
+candidates; review the "expected" id it writes (the current top pick) by hand.
+"""
+import argparse
+import glob
+import json
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURE_DIR = os.path.join(ROOT, "benchmarks", "fixtures", "search")
+sys.path.insert(0, ROOT)
+
+import HaveIT
+from thefuzz import fuzz
+
+
+def legacy_scores(candidates, song_name, artist_name):
+    """Per-candidate V4 scoring as it was before batching, used as the reference."""
+    target_clean = f"{artist_name} {song_name}".lower()
+    artist_lower = artist_name.lower()
+    scores = []
+    for vid in candidates:
+        vid_title = vid.get('title', '') or ''
+        vid_channel = vid.get('uploader', '') or vid.get('channel', '') or ''
+        view_count = vid.get('view_count', 0) or 0
+        duration = vid.get('duration', 0) or 0
+        score = min(view_count / 1000000, 80)
+        if " - Topic" in vid_channel: score += 50
+        elif artist_lower in vid_channel.lower(): score += 40
+        elif "VEVO" in vid_channel.upper(): score += 30
+        score += fuzz.token_set_ratio(target_clean, vid_title.lower()) * 0.5
+        if duration > 600: score -= 50
+        if duration < 90: score -= 20
+        low = vid_title.lower()
+        if "remix" in low and "remix" not in target_clean: score -= 100
+        if "cover" in low: score -= 100
+        if "live" in low and "live" not in target_clean: score -= 50
+        if "official video" in low or "official music video" in low: score += 15
+        scores.append(score)
+    return scores
+
+
+def load_fixtures():
+    fixtures = []
+    for path in sorted(glob.glob(os.path.join(FIXTURE_DIR, "*.json"))):
+        with open(path, encoding="utf-8") as f:
+            fx = json.load(f)
+        fx['name'] = os.path.splitext(os.path.basename(path))[0]
+        fixtures.append(fx)
+    return fixtures
+
+
+def time_call(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(samples)
+
+
+def run(iterations):
+    fixtures = load_fixtures()
+    if not fixtures:
+        print(f"No fixtures in {FIXTURE_DIR}")
+        return 1
+
+    correct = 0
+    mismatched = 0
+    batched_us = []
+    legacy_us = []
+    print(f"{'fixture':<24} {'result':<8} {'batched µs':>11} {'legacy µs':>10}")
+    for fx in fixtures:
+        cands, song, artist = fx['candidates'], fx['song'], fx['artist']
+        url = HaveIT.pick_best_candidate(cands, song, artist)
+        picked = next((c['id'] for c in cands if c.get('url') == url), None)
+        ok = picked == fx['expected']
+        correct += ok
+
+        if [round(s, 6) for s in HaveIT.score_candidates(cands, song, artist)] != [round(s, 6) for s in legacy_scores(cands, song, artist)]:
+            mismatched += 1
+
+        b = time_call(lambda: HaveIT.score_candidates(cands, song, artist), iterations)
+        l = time_call(lambda: legacy_scores(cands, song, artist), iterations)
+        batched_us.append(b)
+        legacy_us.append(l)
+        print(f"{fx['name']:<24} {'ok' if ok else 'MISS':<8} {b:>11.1f} {l:>10.1f}" + ("" if ok else f"  picked={picked} expected={fx['expected']}"))
+
+    print()
+    print(f"accuracy:        {correct}/{len(fixtures)} ({correct / len(fixtures):.0%})")
+    print(f"score mismatch:  {mismatched} fixture(s) differ from the legacy scorer")
+    print(f"median latency:  batched {statistics.median(batched_us):.1f} µs, legacy {statistics.median(legacy_us):.1f} µs per query")
+    return 0 if correct == len(fixtures) and not mismatched else 1
+
+
+def record(artist, song, name):
+    opts = {'proxy': HaveIT.PROXY_URL, 'quiet': True, 'extract_flat': True,
+            'extractor_args': {'youtube': {'player_client': ['android', 'web']}}}
+    with HaveIT.yt_dlp.YoutubeDL(opts) as ydl:
+        res = ydl.extract_info(f"ytsearch10:{artist} - {song}", download=False)
+    cands = [HaveIT.slim_candidate(v) for v in res.get('entries') or [] if v]
+    url = HaveIT.pick_best_candidate(cands, song, artist)
+    expected = next((c['id'] for c in cands if c.get('url') == url), None)
+    path = os.path.join(FIXTURE_DIR, f"{name}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"artist": artist, "song": song, "expected": expected, "candidates": cands}, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+    print(f"Saved {len(cands)} candidates to {path} (expected={expected}, please verify)")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--record", nargs=3, metavar=("ARTIST", "SONG", "NAME"))
+    args = parser.parse_args()
+    sys.exit(record(*args.record) if args.record else run(args.iterations))
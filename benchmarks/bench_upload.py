@@ -0,0 +1,87 @@
+"""
+Upload benchmark: multipart uploads vs. a local Bot API server.
+
+Sends --files MP3-sized files with a thumbnail through HaveIT.upload_audio to
+fake_bot_api twice: as the cloud API gets them (multipart, the file bytes
+cross the socket) and in local mode (TELEGRAM_LOCAL_MODE), where only a
+file:// path is sent and the stand-in server reads the file from disk.
+--bandwidth-mbit caps the simulated uplink for request bodies, like the
+link to api.telegram.org; 0 measures the client-side cost alone.
+
+    python benchmarks/bench_upload.py --size-mb 45 --files 5
+    python benchmarks/bench_upload.py --size-mb 45 --files 5 --bandwidth-mbit 100
+"""
+import argparse
+import asyncio
+import logging
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import HaveIT
+from fake_bot_api import FakeBotAPI
+from telegram.ext import ExtBot
+from telegram.request import HTTPXRequest
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+def make_files(workdir, count, size_mb):
+    files = []
+    for n in range(count):
+        path = os.path.join(workdir, f"track{n}.mp3")
+        with open(path, "wb") as f:
+            f.write(b"ID3")
+            for _ in range(size_mb): f.write(os.urandom(1024 * 1024))
+        files.append(path)
+    thumb = os.path.join(workdir, "thumb.jpg")
+    with open(thumb, "wb") as f: f.write(b"\xff\xd8" + os.urandom(30 * 1024))
+    return files, thumb
+
+
+async def run_mode(api, local_mode, files, thumb):
+    bot = ExtBot("123456:bench", base_url=api.base_url, local_mode=local_mode, rate_limiter=HaveIT.OutboundLimiter(),
+                 request=HTTPXRequest(connect_timeout=300, read_timeout=300, write_timeout=300))
+    before = api.bytes_received, api.bytes_read_from_disk
+    times = []
+    async with bot:
+        for path in files:
+            start = time.perf_counter()
+            await HaveIT.upload_audio(bot, 1000, path, thumb, title="Bench", performer="Bench")
+            times.append(time.perf_counter() - start)
+    return times, api.bytes_received - before[0], api.bytes_read_from_disk - before[1]
+
+
+async def main(args):
+    workdir = tempfile.mkdtemp(prefix="haveit-upload-")
+    try:
+        files, thumb = make_files(workdir, args.files, args.size_mb)
+        api = FakeBotAPI(chat_burst=10 ** 9, upload_bandwidth=args.bandwidth_mbit * 125000).start()
+        print(f"{args.files} files x {args.size_mb} MiB, uplink "
+              f"{f'{args.bandwidth_mbit} Mbit/s' if args.bandwidth_mbit else 'unlimited'}")
+        print(f"{'mode':<11} {'total s':>8} {'per file s':>11} {'MiB/s':>8} {'sent MiB':>9} {'read MiB':>9}")
+        for name, local_mode in (("multipart", False), ("local", True)):
+            times, sent, read = await run_mode(api, local_mode, files, thumb)
+            total = sum(times)
+            print(f"{name:<11} {total:>8.2f} {total / len(times):>11.3f} {args.files * args.size_mb / total:>8.1f} "
+                  f"{sent / 1024 ** 2:>9.1f} {read / 1024 ** 2:>9.1f}")
+        api.stop()
+        print(f"\npeak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MiB")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=3)
+    parser.add_argument("--size-mb", type=int, default=20)
+    parser.add_argument("--bandwidth-mbit", type=float, default=0, help="simulated uplink for request bodies")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,164 @@
+"""
+Minimal stand-in for the Telegram Bot API, for benchmarks.
+
+Answers the methods HaveIT calls with plausible JSON, records every request
+and enforces Telegram-like flood limits: a chat that sends more than
+`chat_burst` messages within `chat_window` seconds gets a 429 with
+retry_after, and `flood_rate` injects random 429s on top.
+
+`upload_bandwidth` (bytes/s) delays large request bodies like a real uplink.
+file:// inputs, which a local-mode bot sends instead of uploading, are read
+from disk the way a local Bot API server would.
+
+    python benchmarks/fake_bot_api.py --port 8081
+    TELEGRAM_BASE_URL=http://127.0.0.1:8081/bot python HaveIT.py
+"""
+import argparse
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+FIELD_RE = r'name="{}"\r\n(?:[^\r\n]+\r\n)*\r\n([^\r\n]*)'
+RATE_LIMITED = ('send', 'copy', 'forward', 'edit', 'delete')
+FILE_FIELDS = ('audio', 'photo', 'document', 'thumbnail')
+
+
+def form_field(body, content_type, name):
+    if content_type.startswith("application/x-www-form-urlencoded"):
+        return (parse_qs(body.decode("utf-8", "replace")).get(name) or [None])[0]
+    if content_type.startswith("application/json"):
+        value = json.loads(body or b"{}").get(name)
+        return None if value is None else str(value)
+    m = re.search(FIELD_RE.format(name).encode(), body)
+    return m.group(1).decode("utf-8", "replace") if m else None
+
+
+class FakeBotAPI:
+    def __init__(self, host="127.0.0.1", port=0, chat_burst=3, chat_window=2.0, flood_rate=0.0, retry_after=1, latency=0.0,
+                 upload_bandwidth=0):
+        self.chat_burst = chat_burst
+        self.chat_window = chat_window
+        self.flood_rate = flood_rate
+        self.retry_after = retry_after
+        self.latency = latency
+        self.upload_bandwidth = upload_bandwidth
+        self.bytes_received = 0
+        self.bytes_read_from_disk = 0
+        self.lock = threading.Lock()
+        self.message_ids = itertools.count(1000)
+        self.recent = defaultdict(deque)
+        self.log = []
+        self.updates = deque()
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args): pass
+
+            def do_GET(self): self.handle_call(b"")
+
+            def do_POST(self):
+                self.handle_call(self.rfile.read(int(self.headers.get("Content-Length") or 0)))
+
+            def handle_call(self, body):
+                method = self.path.rstrip("/").rsplit("/", 1)[-1]
+                status, payload = api.call(method, body, self.headers.get("Content-Type", ""))
+                raw = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/bot"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def flooded(self, chat_id, now):
+        window = self.recent[chat_id]
+        while window and now - window[0] > self.chat_window: window.popleft()
+        if len(window) >= self.chat_burst or random.random() < self.flood_rate: return True
+        window.append(now)
+        return False
+
+    def read_local_files(self, body, content_type):
+        for field in FILE_FIELDS:
+            value = form_field(body, content_type, field)
+            if not value or not value.startswith("file://"): continue
+            with open(unquote(urlparse(value).path), "rb") as f:
+                size = sum(len(block) for block in iter(lambda: f.read(1024 * 1024), b""))
+            with self.lock: self.bytes_read_from_disk += size
+
+    def call(self, method, body, content_type):
+        if self.latency: time.sleep(self.latency)
+        if self.upload_bandwidth and len(body) > 64 * 1024: time.sleep(len(body) / self.upload_bandwidth)
+        with self.lock: self.bytes_received += len(body)
+        if method.startswith("send"): self.read_local_files(body, content_type)
+        chat_id = form_field(body, content_type, "chat_id")
+        now = time.monotonic()
+        with self.lock:
+            limited = method.startswith(RATE_LIMITED) and chat_id is not None
+            if limited and self.flooded(chat_id, now):
+                self.log.append((now, method, chat_id, 429))
+                return 429, {"ok": False, "error_code": 429, "description": "Too Many Requests: retry later",
+                             "parameters": {"retry_after": self.retry_after}}
+            self.log.append((now, method, chat_id, 200))
+            if method == "getUpdates":
+                updates = list(self.updates)
+                self.updates.clear()
+                return 200, {"ok": True, "result": updates}
+        return 200, {"ok": True, "result": self.result(method, chat_id)}
+
+    def result(self, method, chat_id):
+        if method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "HaveIT", "username": "haveit_fake_bot",
+                    "can_join_groups": True, "can_read_all_group_messages": False, "supports_inline_queries": False}
+        if method in ("deleteMessage", "deleteMessages", "answerCallbackQuery", "deleteWebhook", "setWebhook", "setMyCommands"):
+            return True
+        if method == "copyMessage": return {"message_id": next(self.message_ids)}
+        if method == "getChat": return {"id": int(chat_id or 0), "type": "private"}
+        cid = int(chat_id) if chat_id and chat_id.lstrip("-").isdigit() else 0
+        message_id = next(self.message_ids)
+        message = {"message_id": message_id, "date": int(time.time()),
+                   "chat": {"id": cid, "type": "private" if cid > 0 else "channel"}, "text": ""}
+        if method == "sendAudio":
+            message["audio"] = {"file_id": f"audio-{message_id}", "file_unique_id": f"ua-{message_id}", "duration": 0}
+        elif method == "sendPhoto":
+            message["photo"] = [{"file_id": f"photo-{message_id}", "file_unique_id": f"up-{message_id}", "width": 320, "height": 320}]
+        return message
+
+    def summary(self):
+        with self.lock: log = list(self.log)
+        by_method = defaultdict(lambda: [0, 0])
+        for _, method, _, status in log: by_method[method][status == 429] += 1
+        return {m: {"ok": ok, "429": flood} for m, (ok, flood) in sorted(by_method.items())}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--flood-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    api = FakeBotAPI(port=args.port, flood_rate=args.flood_rate)
+    print(f"Fake Bot API on {api.base_url}")
+    try: api.server.serve_forever()
+    except KeyboardInterrupt: print(json.dumps(api.summary(), indent=2))
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Stand-in for warp-cli, used as WARP_CLI by bench_route.
+
+Keeps the tunnel state in the JSON file named by FAKE_WARP_STATE:
+
+- connected: whether the tunnel is up
+- broken: up, but the route is blocked (the SOCKS stand-in refuses it)
+- bad_connects: how many of the next connects come up broken
+- calls: [command, start, end] for every invocation, to check that
+  rotations never overlap
+
+Each call takes FAKE_WARP_DELAY seconds (default 0.05).
+
+    FAKE_WARP_STATE=/tmp/warp.json fake_warp_cli.py connect
+"""
+import fcntl
+import json
+import os
+import sys
+import time
+
+STATE = os.environ.get("FAKE_WARP_STATE", "fake_warp.json")
+
+
+def load():
+    try:
+        with open(STATE) as f: return json.load(f)
+    except (OSError, ValueError):
+        return {"connected": True, "broken": False, "bad_connects": 0, "calls": []}
+
+
+def save(state):
+    tmp = STATE + ".tmp"
+    with open(tmp, "w") as f: json.dump(state, f)
+    os.replace(tmp, STATE)
+
+
+def update(fn):
+    """Applies fn to the state under an exclusive lock."""
+    with open(STATE + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        state = load()
+        fn(state)
+        save(state)
+        return state
+
+
+def main(command):
+    start = time.time()
+    time.sleep(float(os.environ.get("FAKE_WARP_DELAY", "0.05")))
+
+    def apply(state):
+        if command == "connect":
+            state["connected"] = True
+            state["broken"] = state["bad_connects"] > 0
+            state["bad_connects"] = max(0, state["bad_connects"] - 1)
+        elif command == "disconnect":
+            state["connected"] = False
+        state["calls"].append([command, start, time.time()])
+
+    state = update(apply)
+    if command == "status": print("Status update: " + ("Connected" if state["connected"] else "Disconnected"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1] if len(sys.argv) > 1 else "status"))
@@ -0,0 +1,87 @@
+"""
+Local media source for benchmarks.
+
+Generates N sine-tone tracks and cover images with ffmpeg and serves one HTML
+page per track (og:title, og:image and an <audio> tag), which yt-dlp's
+generic extractor resolves like a real media page:
+
+    http://127.0.0.1:<port>/track/<n>  ->  /audio/<n>.m4a, /cover/<n>.jpg
+"""
+import functools
+import html
+import os
+import subprocess
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPES = {".m4a": "audio/mp4", ".jpg": "image/jpeg"}
+
+
+def generate_media(root, tracks, duration):
+    os.makedirs(os.path.join(root, "audio"), exist_ok=True)
+    os.makedirs(os.path.join(root, "cover"), exist_ok=True)
+    for n in range(1, tracks + 1):
+        audio = os.path.join(root, "audio", f"{n}.m4a")
+        cover = os.path.join(root, "cover", f"{n}.jpg")
+        if not os.path.exists(audio):
+            subprocess.run(["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-f", "lavfi",
+                            "-i", f"sine=frequency={220 + 20 * n}:duration={duration}", "-c:a", "aac", "-b:a", "128k", audio], check=True)
+        if not os.path.exists(cover):
+            subprocess.run(["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-f", "lavfi",
+                            "-i", f"color=c=0x{(n * 2654435761) & 0xFFFFFF:06x}:s=1280x720", "-frames:v", "1", cover], check=True)
+
+
+class MediaServer:
+    def __init__(self, root, tracks=5, duration=30, host="127.0.0.1", port=0):
+        self.root = root
+        self.tracks = tracks
+        generate_media(root, tracks, duration)
+        server = self
+
+        class Handler(SimpleHTTPRequestHandler):
+            def log_message(self, *args): pass
+
+            def guess_type(self, path):
+                return CONTENT_TYPES.get(os.path.splitext(path)[1], super().guess_type(path))
+
+            def do_GET(self):
+                if self.path.startswith("/track/"): return self.send_page(self.path.rsplit("/", 1)[-1])
+                super().do_GET()
+
+            def send_page(self, n):
+                if not n.isdigit() or not 1 <= int(n) <= server.tracks: return self.send_error(404)
+                title = html.escape(server.title(int(n)))
+                body = (f'<html><head><title>{title}</title><meta property="og:title" content="{title}">'
+                        f'<meta property="og:image" content="{server.base_url}/cover/{n}.jpg"></head>'
+                        f'<body><audio src="{server.base_url}/audio/{n}.m4a"></audio></body></html>').encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer((host, port), functools.partial(Handler, directory=root))
+        self.server.daemon_threads = True
+
+    @property
+    def host(self):
+        host, port = self.server.server_address[:2]
+        return f"{host}:{port}"
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}"
+
+    def title(self, n):
+        return f"Bench Artist {n % 3 + 1} - Tone {n}"
+
+    def track_url(self, n):
+        return f"{self.base_url}/track/{n}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
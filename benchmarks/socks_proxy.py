@@ -0,0 +1,74 @@
+"""
+Minimal SOCKS5 stand-in for the Warp tunnel, for bench_route.
+
+Speaks no-auth SOCKS5 CONNECT and relays bytes. While fake_warp_cli's state
+says the tunnel is down or broken it answers every CONNECT with a general
+failure, like a blocked route.
+"""
+import json
+import select
+import socket
+import socketserver
+import struct
+import threading
+
+
+class SocksProxy:
+    def __init__(self, state_path, host="127.0.0.1", port=0):
+        self.state_path = state_path
+        self.refused = 0
+        self.relayed = 0
+        proxy = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                conn = self.request
+                try:
+                    version, methods = conn.recv(2)
+                    conn.recv(methods)
+                    conn.sendall(b"\x05\x00")
+                    version, cmd, _, atyp = conn.recv(4)
+                    if atyp == 1: host = socket.inet_ntoa(conn.recv(4))
+                    elif atyp == 3: host = conn.recv(conn.recv(1)[0]).decode()
+                    else: host = socket.inet_ntop(socket.AF_INET6, conn.recv(16))
+                    port = struct.unpack(">H", conn.recv(2))[0]
+                    if cmd != 1 or not proxy.route_up():
+                        proxy.refused += 1
+                        conn.sendall(b"\x05\x01\x00\x01" + bytes(6))
+                        return
+                    upstream = socket.create_connection((host, port), timeout=5)
+                except (OSError, ValueError):
+                    return
+                proxy.relayed += 1
+                conn.sendall(b"\x05\x00\x00\x01" + bytes(6))
+                with upstream:
+                    while True:
+                        ready, _, _ = select.select([conn, upstream], [], [], 5)
+                        if not ready: return
+                        for src in ready:
+                            data = src.recv(65536)
+                            if not data: return
+                            (upstream if src is conn else conn).sendall(data)
+
+        self.server = socketserver.ThreadingTCPServer((host, port), Handler)
+        self.server.daemon_threads = True
+
+    def route_up(self):
+        try:
+            with open(self.state_path) as f: state = json.load(f)
+        except (OSError, ValueError):
+            return True
+        return state.get("connected", True) and not state.get("broken")
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"socks5://{host}:{port}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,57 @@
+"""
+Stub LrcLib and Genius endpoints for benchmarks.
+
+/api/search echoes the query back as one LrcLib track with plain lyrics, so
+every lookup verifies; Genius' /api/search/multi returns no hits.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class StubLyricsServer:
+    def __init__(self, host="127.0.0.1", port=0, latency=0.05):
+        self.latency = latency
+        self.requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args): pass
+
+            def do_GET(self):
+                stub.requests += 1
+                if stub.latency: time.sleep(stub.latency)
+                url = urlparse(self.path)
+                query = (parse_qs(url.query).get("q") or [""])[0]
+                if url.path == "/api/search":
+                    payload = [{"id": 1, "trackName": query, "artistName": query, "instrumental": False,
+                                "plainLyrics": f"{query}\nla la la", "syncedLyrics": None}]
+                elif url.path == "/api/search/multi":
+                    payload = {"response": {"sections": []}}
+                else:
+                    self.send_error(404)
+                    return
+                body = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()